@@ -5,7 +5,13 @@ from flask_cors import CORS
 from flask_migrate import Migrate
 from config import DevelopmentConfig
 from models import db
-from utils import error_response
+from utils import error_response, init_query_budget
+from cache import init_cache
+from versions import init_versions
+from upload_gc import init_upload_gc
+from category_closure import init_category_closure
+from category_stats import init_category_stats
+from primary_images import init_primary_images
 import os
 
 # 导入蓝图
@@ -16,6 +22,9 @@ from requests import requests_bp
 from reviews import reviews_bp
 from messages import messages_bp
 from statistics import statistics_bp
+from saved_searches import saved_searches_bp
+from uploads import uploads_bp
+from media import media_bp
 
 
 def create_app(config_class=DevelopmentConfig):
@@ -28,6 +37,13 @@ def create_app(config_class=DevelopmentConfig):
     jwt = JWTManager(app)
     CORS(app, origins="*", supports_credentials=True, allow_headers=["Content-Type", "Authorization"])
     migrate = Migrate(app, db)
+    init_query_budget(app)
+    shared_cache = init_cache(app)
+    init_versions(app, shared_cache)
+    init_upload_gc(app)
+    init_category_closure(app)
+    init_category_stats(app)
+    init_primary_images(app)
     
     # 创建上传目录
     upload_folder = app.config['UPLOAD_FOLDER']
@@ -42,6 +58,9 @@ def create_app(config_class=DevelopmentConfig):
     app.register_blueprint(reviews_bp)       # 评价管理API
     app.register_blueprint(messages_bp)      # 消息管理API
     app.register_blueprint(statistics_bp)    # 统计数据API
+    app.register_blueprint(saved_searches_bp)  # 保存的搜索API
+    app.register_blueprint(uploads_bp)       # 多图上传和分片上传API
+    app.register_blueprint(media_bp)         # 上传图片的发送
 
     
     # JWT错误处理
@@ -131,7 +150,9 @@ def create_app(config_class=DevelopmentConfig):
                 'requests': '/api/v1/requests',
                 'reviews': '/api/v1/reviews',
                 'messages': '/api/v1/messages',
-                'upload': '/api/v1/upload/image'
+                'upload': '/api/v1/upload/image',
+                'upload_images': '/api/v1/upload/images',
+                'upload_sessions': '/api/v1/upload/sessions'
             }
         })
     
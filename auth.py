@@ -1,7 +1,9 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
 from models import User, db
-from utils import success_response, error_response, validate_required_fields, get_current_user
+from sqlalchemy import func
+from utils import success_response, error_response, validate_required_fields, get_current_user, paginate_keyset, is_valid_cursor
+from serializers import USER_FIELDS, parse_fields, load_fields
 import re
 
 auth_bp = Blueprint('auth', __name__, url_prefix='/api/v1/users')
@@ -18,6 +20,64 @@ def validate_phone(phone):
     pattern = r'^1[3-9]\d{9}$'
     return re.match(pattern, phone) is not None
 
+def serialize_user_list(users, fields=None):
+    """转换用户列表数据，添加物品、请求和交易次数统计
+
+    各项计数按用户分组一次查出，整页只需固定的4次聚合查询；
+    fields 为需要返回的字段集合（None 表示全部），没有请求的计数不会查询。
+    """
+    from models import Item, Request
+    wants = lambda name: fields is None or name in fields
+    user_ids = [user.user_id for user in users]
+    items_counts = {}
+    requests_counts = {}
+    transactions_counts = {}
+    
+    if user_ids and wants('items_count'):
+        items_counts = dict(db.session.query(Item.user_id, func.count(Item.item_id))
+                            .filter(Item.user_id.in_(user_ids))
+                            .group_by(Item.user_id).all())
+    if user_ids and wants('requests_count'):
+        requests_counts = dict(db.session.query(Request.requester_id, func.count(Request.request_id))
+                               .filter(Request.requester_id.in_(user_ids))
+                               .group_by(Request.requester_id).all())
+    
+    if user_ids and wants('transactions_count'):
+        # 交易次数 = 作为请求者完成的交易 + 作为物品所有者完成的交易（排除自己请求自己的物品，避免重复计数）
+        as_requester = db.session.query(Request.requester_id, func.count(Request.request_id))\
+            .filter(Request.requester_id.in_(user_ids), Request.status == 'completed')\
+            .group_by(Request.requester_id).all()
+        as_owner = db.session.query(Item.user_id, func.count(Request.request_id))\
+            .select_from(Request)\
+            .join(Item, Request.item_id == Item.item_id)\
+            .filter(Item.user_id.in_(user_ids), Request.status == 'completed',
+                    Request.requester_id != Item.user_id)\
+            .group_by(Item.user_id).all()
+        for user_id, count in as_requester + as_owner:
+            transactions_counts[user_id] = transactions_counts.get(user_id, 0) + count
+    
+    user_list = []
+    for user in users:
+        try:
+            user_data = user.to_dict(include_sensitive=True, fields=fields)
+            if wants('items_count'):
+                user_data['items_count'] = items_counts.get(user.user_id, 0)
+            if wants('requests_count'):
+                user_data['requests_count'] = requests_counts.get(user.user_id, 0)
+            if wants('transactions_count'):
+                user_data['transactions_count'] = transactions_counts.get(user.user_id, 0)
+            
+            # 添加最后登录时间
+            if wants('last_login'):
+                user_data['last_login'] = user.created_at.isoformat() if user.created_at else None
+            
+            user_list.append(user_data)
+        except Exception as e:
+            # 如果单个用户数据转换失败，跳过该用户
+            print(f"转换用户数据失败 (user_id: {user.user_id}): {str(e)}")
+            continue
+    return user_list
+
 @auth_bp.route('/register', methods=['POST'])
 def register():
     """用户注册"""
@@ -287,6 +347,17 @@ def get_all_users():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         search = request.args.get('search', '').strip()
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        if after is not None and not is_valid_cursor(after):
+            return error_response("分页游标无效")
+        
+        # 稀疏字段集：fields=user_id,username 只返回指定字段
+        try:
+            fields = parse_fields(request.args.get('fields'), USER_FIELDS, 'user_id')
+        except ValueError as e:
+            return error_response(str(e))
         
         query = User.query
         
@@ -297,6 +368,24 @@ def get_all_users():
                 (User.email.contains(search))
             )
         
+        query = load_fields(query, User, USER_FIELDS, fields)
+        
+        # 游标分页：按 (created_at, user_id) 从新到旧
+        if after is not None:
+            result = paginate_keyset(
+                query, User.created_at, User.user_id, after, per_page,
+                with_total=with_total,
+                serializer=lambda rows: serialize_user_list(rows, fields)
+            )
+            
+            return success_response(
+                data={
+                    'users': result['items'],
+                    'pagination': result['pagination']
+                },
+                message="获取用户列表成功"
+            )
+        
         query = query.order_by(User.created_at.desc())
         
         # 手动分页处理，避免使用可能有问题的paginate_query
@@ -308,40 +397,7 @@ def get_all_users():
             users = query.offset((page - 1) * per_page).limit(per_page).all()
             
             # 转换用户数据
-            user_list = []
-            for user in users:
-                try:
-                    user_data = user.to_dict(include_sensitive=True)
-                    # 安全地获取关联数据计数
-                    try:
-                        user_data['items_count'] = user.items.count()
-                    except Exception:
-                        user_data['items_count'] = 0
-                    
-                    try:
-                        user_data['requests_count'] = user.requests.count()
-                    except Exception:
-                        user_data['requests_count'] = 0
-                    
-                    # 添加交易次数统计
-                    try:
-                        from models import Request
-                        completed_requests = Request.query.filter(
-                            ((Request.requester_id == user.user_id) | (Request.item.has(user_id=user.user_id))) &
-                            (Request.status == 'completed')
-                        ).count()
-                        user_data['transactions_count'] = completed_requests
-                    except Exception:
-                        user_data['transactions_count'] = 0
-                    
-                    # 添加最后登录时间
-                    user_data['last_login'] = user.created_at.isoformat() if user.created_at else None
-                    
-                    user_list.append(user_data)
-                except Exception as e:
-                    # 如果单个用户数据转换失败，跳过该用户
-                    print(f"转换用户数据失败 (user_id: {user.user_id}): {str(e)}")
-                    continue
+            user_list = serialize_user_list(users, fields)
             
             # 计算分页信息
             pages = (total + per_page - 1) // per_page
@@ -421,6 +477,7 @@ def delete_user(user_id):
             # 删除用户的物品
             from models import Item
             user_items = Item.query.filter_by(user_id=user_id).all()
+            deleted_item_ids = [item.item_id for item in user_items]
             for item in user_items:
                 db.session.delete(item)
             
@@ -454,6 +511,13 @@ def delete_user(user_id):
             db.session.delete(user)
             db.session.commit()
             
+            # 同步移除已删除物品的进程内索引
+            from items import remove_item_indexes
+            from saved_search_index import saved_search_index
+            for item_id in deleted_item_ids:
+                remove_item_indexes(item_id)
+            saved_search_index.remove_user(user_id)
+            
             return success_response(
                 message=f"用户 {user.username} 已成功删除"
             )
@@ -0,0 +1,174 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+class LRUCache:
+    """带过期时间的进程内LRU缓存"""
+
+    def __init__(self, maxsize=1024, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()  # key -> (过期时间, value)
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """读取缓存，不存在或已过期时返回 None"""
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        """写入缓存，超出容量时淘汰最久未使用的条目"""
+        ttl = self.ttl if ttl is None else ttl
+        if self.maxsize <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._data[key] = (time.monotonic() + ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+class LocalSharedBackend:
+    """共享缓存后端的本地替身
+
+    只实现了 redis-py 客户端中用到的 get/set/delete/incr 子集，
+    生产环境可以直接换成 redis.Redis 实例，开发和测试时用它代替。
+    """
+
+    def __init__(self):
+        self._data = {}  # name -> (过期时间或None, bytes)
+        self._lock = threading.Lock()
+
+    def get(self, name):
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[name]
+                return None
+            return value
+
+    def set(self, name, value, ex=None):
+        if isinstance(value, str):
+            value = value.encode('utf-8')
+        with self._lock:
+            self._data[name] = (time.monotonic() + ex if ex else None, value)
+        return True
+
+    def delete(self, *names):
+        with self._lock:
+            return sum(1 for name in names if self._data.pop(name, None) is not None)
+
+    def incr(self, name, amount=1):
+        with self._lock:
+            expires_at, value = self._data.get(name, (None, b'0'))
+            value = int(value) + amount
+            self._data[name] = (expires_at, str(value).encode('utf-8'))
+            return value
+
+
+class PayloadCache:
+    """JSON载荷的两级缓存：进程内LRU + 可选的共享后端
+
+    读取时先查本地LRU，未命中再查共享后端并回填本地；写入和失效同时作用于两级。
+    载荷以JSON字符串保存，每次读取都返回新的对象，调用方可以放心修改。
+    """
+
+    def __init__(self, namespace, maxsize=1024, ttl=300):
+        self.namespace = namespace
+        self.ttl = ttl
+        self.local = LRUCache(maxsize, ttl)
+        self.shared = None
+
+    def configure(self, maxsize=None, ttl=None, local_ttl=None, shared=None):
+        """根据应用配置调整容量、过期时间和共享后端"""
+        if ttl is not None:
+            self.ttl = ttl
+        if maxsize is not None:
+            self.local.maxsize = maxsize
+        self.local.ttl = self.ttl if local_ttl is None else local_ttl
+        self.shared = shared
+        self.local.clear()
+
+    def _key(self, key):
+        return f'{self.namespace}:{key}'
+
+    def get(self, key):
+        """读取缓存的载荷，未命中时返回 None"""
+        raw = self.local.get(key)
+        if raw is None and self.shared is not None:
+            raw = self.shared.get(self._key(key))
+            if raw is not None:
+                if isinstance(raw, bytes):
+                    raw = raw.decode('utf-8')
+                self.local.set(key, raw)
+        return json.loads(raw) if raw is not None else None
+
+    def set(self, key, value):
+        """写入载荷"""
+        if self.ttl <= 0:
+            return
+        raw = json.dumps(value, ensure_ascii=False)
+        self.local.set(key, raw)
+        if self.shared is not None:
+            self.shared.set(self._key(key), raw, ex=self.ttl)
+
+    def delete(self, key):
+        """使载荷失效"""
+        self.local.delete(key)
+        if self.shared is not None:
+            self.shared.delete(self._key(key))
+
+    def get_or_load(self, key, loader):
+        """读穿缓存：未命中时调用 loader 生成载荷并写入，loader 返回 None 时不缓存"""
+        value = self.get(key)
+        if value is None:
+            value = loader()
+            if value is not None:
+                self.set(key, value)
+        return value
+
+
+# 物品详情载荷缓存
+item_cache = PayloadCache('item')
+# 物品列表分面统计缓存
+facet_cache = PayloadCache('facets', maxsize=512, ttl=60)
+
+
+def init_cache(app):
+    """根据应用配置初始化缓存，返回解析后的共享后端（未配置时为 None）"""
+    shared = app.config.get('CACHE_SHARED_BACKEND')
+    if shared == 'local':
+        shared = LocalSharedBackend()
+    item_cache.configure(
+        maxsize=app.config.get('ITEM_CACHE_SIZE'),
+        ttl=app.config.get('ITEM_CACHE_TTL'),
+        local_ttl=app.config.get('ITEM_CACHE_LOCAL_TTL'),
+        shared=shared
+    )
+    facet_cache.configure(
+        maxsize=app.config.get('FACET_CACHE_SIZE'),
+        ttl=app.config.get('FACET_CACHE_TTL'),
+        shared=shared
+    )
+    return shared
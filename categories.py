@@ -1,29 +1,41 @@
 from flask import Blueprint, request, jsonify
-from models import ItemCategory, Item, db
-from utils import success_response, error_response, validate_required_fields, paginate_query, admin_required
+from models import ItemCategory, Item, SavedSearch, db
+from utils import success_response, error_response, validate_required_fields, paginate_query, admin_required, versioned
 from sqlalchemy import func
+from suggest_index import suggest_index
+from saved_search_index import saved_search_index
+from category_closure import add_category_paths, move_category_paths, remove_category_paths, is_descendant
+from category_stats import subtree_available_counts
+from category_tree import category_tree
 
 categories_bp = Blueprint('categories', __name__, url_prefix='/api/v1/categories')
 
 @categories_bp.route('', methods=['GET'])
+@versioned('item_category', 'item')
 def get_categories():
     """获取分类列表"""
     try:
         include_children = request.args.get('include_children', 'false').lower() == 'true'
         parent_id = request.args.get('parent_id', type=int)
         
+        # 分类结构从内存中的分类树快照读取
+        tree = category_tree.snapshot()
         if parent_id is not None:
             # 获取指定父分类下的子分类
-            categories = ItemCategory.query.filter_by(parent_id=parent_id).all()
+            category_ids = tree.children_of(parent_id)
         else:
             # 获取所有根分类
-            categories = ItemCategory.query.filter_by(parent_id=None).all()
+            category_ids = tree.roots()
+        
+        # 物品数量统计（包含所有子分类的物品数量），由分类计数沿分类树汇总
+        item_counts = subtree_available_counts(tree)
         
         categories_data = []
-        for category in categories:
-            category_data = category.to_dict(include_children=include_children)
-            # 添加物品数量统计（包含所有子分类的物品数量）
-            category_data['item_count'] = category.get_total_item_count()
+        for category_id in category_ids:
+            category_data = tree.to_dict(category_id)
+            if include_children:
+                category_data['children'] = [tree.to_dict(child_id) for child_id in tree.children_of(category_id)]
+            category_data['item_count'] = item_counts.get(category_id, 0)
             categories_data.append(category_data)
         
         return success_response(
@@ -35,26 +47,22 @@ def get_categories():
         return error_response(f"获取分类列表失败: {str(e)}", 500)
 
 @categories_bp.route('/tree', methods=['GET'])
+@versioned('item_category', 'item')
 def get_categories_tree():
     """获取完整的分类树"""
     try:
-        # 获取所有根分类
-        root_categories = ItemCategory.query.filter_by(parent_id=None).all()
+        # 分类结构从内存中的分类树快照读取，每个分类子树的物品数由分类计数汇总得到
+        tree = category_tree.snapshot()
+        item_counts = subtree_available_counts(tree)
         
-        def build_tree(category):
+        def build_tree(category_id):
             """递归构建分类树"""
-            category_data = category.to_dict()
-            category_data['item_count'] = category.get_total_item_count()
-            
-            children = category.children.all()
-            if children:
-                category_data['children'] = [build_tree(child) for child in children]
-            else:
-                category_data['children'] = []
-            
+            category_data = tree.to_dict(category_id)
+            category_data['item_count'] = item_counts.get(category_id, 0)
+            category_data['children'] = [build_tree(child_id) for child_id in tree.children_of(category_id)]
             return category_data
         
-        tree_data = [build_tree(category) for category in root_categories]
+        tree_data = [build_tree(category_id) for category_id in tree.roots()]
         
         return success_response(
             data=tree_data,
@@ -129,7 +137,10 @@ def create_category():
         )
         
         db.session.add(category)
+        db.session.flush()
+        add_category_paths(category)
         db.session.commit()
+        suggest_index.upsert_category(category.category_id, category.name)
         
         return success_response(
             data=category.to_dict(),
@@ -181,21 +192,17 @@ def update_category(category_id):
                 if not new_parent:
                     return error_response("父分类不存在")
                 
-                # 检查是否会形成循环引用
-                def check_circular_reference(parent_id, target_id):
-                    if parent_id == target_id:
-                        return True
-                    parent = ItemCategory.query.get(parent_id)
-                    if parent and parent.parent_id:
-                        return check_circular_reference(parent.parent_id, target_id)
-                    return False
-                
-                if check_circular_reference(new_parent_id, category_id):
+                # 检查是否会形成循环引用：新父分类不能是自身或自身的后代。
+                # 在本事务中查询闭包表，不使用可能落后于其他请求提交的分类树快照
+                if is_descendant(new_parent_id, category_id):
                     return error_response("不能将分类设置为其子分类的父分类")
             
+            if new_parent_id != category.parent_id:
+                move_category_paths(category_id, new_parent_id)
             category.parent_id = new_parent_id
         
         db.session.commit()
+        suggest_index.upsert_category(category.category_id, category.name)
         
         return success_response(
             data=category.to_dict(),
@@ -224,8 +231,19 @@ def delete_category(category_id):
         if items_count > 0:
             return error_response("该分类下还有物品，无法删除")
         
+        # 限定此分类的保存的搜索通过 ORM 删除，不交给外键的级联删除，
+        # 这样保存的搜索的版本号和进程内索引能与数据库保持一致
+        saved_search_ids = []
+        for saved_search in SavedSearch.query.filter_by(category_id=category_id).all():
+            saved_search_ids.append(saved_search.saved_search_id)
+            db.session.delete(saved_search)
+        
+        remove_category_paths(category_id)
         db.session.delete(category)
         db.session.commit()
+        suggest_index.remove_category(category_id)
+        for saved_search_id in saved_search_ids:
+            saved_search_index.remove(saved_search_id)
         
         return success_response(
             message="分类删除成功",
@@ -244,22 +262,17 @@ def search_categories():
         if not keyword:
             return error_response("搜索关键词不能为空")
         
-        categories = ItemCategory.query.filter(
-            ItemCategory.name.contains(keyword)
-        ).all()
+        tree = category_tree.snapshot()
+        category_ids = tree.search(keyword)
+        item_counts = subtree_available_counts(tree)
         
         categories_data = []
-        for category in categories:
-            category_data = category.to_dict()
-            category_data['item_count'] = category.get_total_item_count()
+        for category_id in category_ids:
+            category_data = tree.to_dict(category_id)
+            category_data['item_count'] = item_counts.get(category_id, 0)
             
             # 添加完整路径
-            path = []
-            current = category
-            while current:
-                path.insert(0, current.name)
-                current = current.parent
-            category_data['full_path'] = ' > '.join(path)
+            category_data['full_path'] = tree.full_paths[category_id]
             
             categories_data.append(category_data)
         
@@ -272,20 +285,20 @@ def search_categories():
         return error_response(f"搜索分类失败: {str(e)}", 500)
 
 @categories_bp.route('/popular', methods=['GET'])
+@versioned('item_category', 'item')
 def get_popular_categories():
     """获取热门分类"""
     try:
         limit = request.args.get('limit', 10, type=int)
         limit = min(limit, 50)  # 限制最大数量
         
-        # 获取所有分类并计算包含子分类的物品总数
-        all_categories = ItemCategory.query.all()
+        # 获取所有分类并计算包含子分类的物品总数（由分类计数汇总，只包含有物品的分类）
+        tree = category_tree.snapshot()
+        item_counts = subtree_available_counts(tree)
         
-        categories_with_count = []
-        for category in all_categories:
-            total_count = category.get_total_item_count()
-            if total_count > 0:  # 只包含有物品的分类
-                categories_with_count.append((category, total_count))
+        categories_with_count = [
+            (category_id, item_counts[category_id]) for category_id in tree.names if category_id in item_counts
+        ]
         
         # 按物品数量排序
         categories_with_count.sort(key=lambda x: x[1], reverse=True)
@@ -294,8 +307,8 @@ def get_popular_categories():
         popular_categories = categories_with_count[:limit]
         
         categories_data = []
-        for category, item_count in popular_categories:
-            category_data = category.to_dict()
+        for category_id, item_count in popular_categories:
+            category_data = tree.to_dict(category_id)
             category_data['item_count'] = item_count
             categories_data.append(category_data)
         
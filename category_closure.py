@@ -0,0 +1,86 @@
+import click
+from sqlalchemy import insert
+from models import ItemCategory, ItemCategoryClosure, db
+
+# 分类闭包表的维护和查询。写操作都在调用方的事务中执行，由调用方统一提交。
+# 分类数量很少，祖先和子树直接取到 Python 中计算，也避免 MySQL 不允许在
+# DELETE 的子查询中引用同一张表的限制。
+
+
+def add_category_paths(category):
+    """为新分类写入闭包行：自身一行，加上父分类的每个祖先各一行（分类需已 flush 拿到ID）"""
+    rows = [{'ancestor_id': category.category_id, 'descendant_id': category.category_id, 'depth': 0}]
+    if category.parent_id is not None:
+        ancestors = db.session.query(ItemCategoryClosure.ancestor_id, ItemCategoryClosure.depth)\
+            .filter(ItemCategoryClosure.descendant_id == category.parent_id).all()
+        rows.extend(
+            {'ancestor_id': ancestor_id, 'descendant_id': category.category_id, 'depth': depth + 1}
+            for ancestor_id, depth in ancestors
+        )
+    db.session.execute(insert(ItemCategoryClosure), rows)
+
+
+def move_category_paths(category_id, new_parent_id):
+    """分类移动到新的父分类下：删除整棵子树与原祖先的关系，再与新祖先建立关系"""
+    subtree = db.session.query(ItemCategoryClosure.descendant_id, ItemCategoryClosure.depth)\
+        .filter(ItemCategoryClosure.ancestor_id == category_id).all()
+    subtree_ids = [descendant_id for descendant_id, _ in subtree]
+
+    db.session.query(ItemCategoryClosure).filter(
+        ItemCategoryClosure.descendant_id.in_(subtree_ids),
+        ItemCategoryClosure.ancestor_id.notin_(subtree_ids)
+    ).delete(synchronize_session=False)
+
+    if new_parent_id is None:
+        return
+    ancestors = db.session.query(ItemCategoryClosure.ancestor_id, ItemCategoryClosure.depth)\
+        .filter(ItemCategoryClosure.descendant_id == new_parent_id).all()
+    rows = [
+        {'ancestor_id': ancestor_id, 'descendant_id': descendant_id, 'depth': ancestor_depth + descendant_depth + 1}
+        for ancestor_id, ancestor_depth in ancestors
+        for descendant_id, descendant_depth in subtree
+    ]
+    if rows:
+        db.session.execute(insert(ItemCategoryClosure), rows)
+
+
+def remove_category_paths(category_id):
+    """删除分类的闭包行（只允许删除没有子分类的分类，所以只有以它为后代的行）"""
+    db.session.query(ItemCategoryClosure).filter(
+        ItemCategoryClosure.descendant_id == category_id
+    ).delete(synchronize_session=False)
+
+
+def is_descendant(category_id, ancestor_id):
+    """category_id 是否是 ancestor_id 自身或它的后代"""
+    return db.session.query(ItemCategoryClosure.depth).filter_by(
+        ancestor_id=ancestor_id, descendant_id=category_id
+    ).first() is not None
+
+
+def rebuild_category_closure():
+    """按 parent_id 重建整张闭包表，返回写入的行数（用于初始化或修复数据）"""
+    parents = dict(db.session.query(ItemCategory.category_id, ItemCategory.parent_id).all())
+    rows = []
+    for category_id in parents:
+        ancestor_id, depth = category_id, 0
+        # 数据中有环时在回到起点前停止
+        while ancestor_id is not None and depth <= len(parents):
+            rows.append({'ancestor_id': ancestor_id, 'descendant_id': category_id, 'depth': depth})
+            ancestor_id, depth = parents.get(ancestor_id), depth + 1
+
+    db.session.query(ItemCategoryClosure).delete(synchronize_session=False)
+    if rows:
+        db.session.execute(insert(ItemCategoryClosure), rows)
+    db.session.commit()
+    return len(rows)
+
+
+def init_category_closure(app):
+    """注册 flask rebuild-category-closure 命令，建表后执行一次以填充已有分类"""
+
+    @app.cli.command('rebuild-category-closure')
+    def rebuild_category_closure_command():
+        """按 parent_id 重建分类闭包表"""
+        count = rebuild_category_closure()
+        click.echo(f"分类闭包表已重建，共 {count} 行")
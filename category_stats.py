@@ -0,0 +1,123 @@
+import threading
+from collections import Counter
+import click
+from sqlalchemy import event, func, insert, update
+from sqlalchemy.dialects import mysql, postgresql, sqlite
+from sqlalchemy.orm import Session, attributes
+from models import CategoryStat, Item, db
+
+# 分类物品计数的增量维护：每次 flush 前根据物品的新增、删除以及状态和分类的变化，
+# 算出各分类可用物品数的增减，在同一事务中更新 category_stat 表；事务回滚时计数一起回滚。
+# 不经过 ORM 对象的批量 UPDATE 看不到属性变化，需要调用方自己算出增量后调用 apply_category_deltas。
+AVAILABLE = 'available'
+
+_listeners_installed = False
+_install_lock = threading.Lock()
+
+
+def _committed_value(obj, key):
+    """属性在本次 flush 之前的值"""
+    history = attributes.get_history(obj, key)
+    if history.deleted:
+        return history.deleted[0]
+    if history.unchanged:
+        return history.unchanged[0]
+    return getattr(obj, key)
+
+
+def _upsert_statement(dialect_name, category_id, delta):
+    """插入计数行，已存在时在原值上累加的单条语句；数据库不支持时返回 None"""
+    values = {'category_id': category_id, 'available_count': max(delta, 0)}
+    incremented = CategoryStat.__table__.c.available_count + delta
+    if dialect_name == 'mysql':
+        return mysql.insert(CategoryStat).values(**values).on_duplicate_key_update(available_count=incremented)
+    dialect_insert = {'sqlite': sqlite.insert, 'postgresql': postgresql.insert}.get(dialect_name)
+    if dialect_insert is None:
+        return None
+    return dialect_insert(CategoryStat).values(**values).on_conflict_do_update(
+        index_elements=['category_id'], set_={'available_count': incremented}
+    )
+
+
+def apply_category_deltas(session, deltas):
+    """把 {分类ID: 可用物品数增量} 累加到 category_stat，分类还没有计数行时插入
+
+    使用数据库的 upsert 语句，两个事务同时为同一个新分类插入计数行时不会因主键冲突失败。
+    """
+    dialect_name = session.get_bind(CategoryStat).dialect.name
+    for category_id, delta in deltas.items():
+        if not delta or category_id is None:
+            continue
+        statement = _upsert_statement(dialect_name, category_id, delta)
+        if statement is not None:
+            session.execute(statement)
+            continue
+        result = session.execute(
+            update(CategoryStat)
+            .where(CategoryStat.category_id == category_id)
+            .values(available_count=CategoryStat.available_count + delta)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount == 0:
+            session.execute(insert(CategoryStat).values(category_id=category_id, available_count=max(delta, 0)))
+
+
+def _on_before_flush(session, flush_context, instances):
+    deltas = Counter()
+    for obj in session.new:
+        # 新物品的 status 在 INSERT 时才取列默认值
+        if isinstance(obj, Item) and (obj.status or AVAILABLE) == AVAILABLE:
+            deltas[obj.category_id] += 1
+    for obj in session.deleted:
+        if isinstance(obj, Item) and _committed_value(obj, 'status') == AVAILABLE:
+            deltas[_committed_value(obj, 'category_id')] -= 1
+    for obj in session.dirty:
+        if not isinstance(obj, Item) or not session.is_modified(obj):
+            continue
+        if _committed_value(obj, 'status') == AVAILABLE:
+            deltas[_committed_value(obj, 'category_id')] -= 1
+        if obj.status == AVAILABLE:
+            deltas[obj.category_id] += 1
+    if deltas:
+        apply_category_deltas(session, deltas)
+
+
+def subtree_available_counts(tree):
+    """读取全部分类计数，沿分类树快照汇总到每个祖先，返回 {分类ID: 子树（含自身）可用物品数}"""
+    totals = Counter()
+    for category_id, count in db.session.query(CategoryStat.category_id, CategoryStat.available_count):
+        if not count:
+            continue
+        for ancestor_id in tree.ancestors.get(category_id, ()):
+            totals[ancestor_id] += count
+    return totals
+
+
+def rebuild_category_stats():
+    """按物品表重新统计各分类的可用物品数（用于初始化或修复数据），返回有物品的分类数"""
+    counts = db.session.query(Item.category_id, func.count(Item.item_id))\
+        .filter(Item.status == AVAILABLE).group_by(Item.category_id).all()
+    db.session.query(CategoryStat).delete(synchronize_session=False)
+    if counts:
+        db.session.execute(insert(CategoryStat), [
+            {'category_id': category_id, 'available_count': count} for category_id, count in counts
+        ])
+    db.session.commit()
+    return len(counts)
+
+
+def init_category_stats(app):
+    """注册维护计数的会话事件和 flask rebuild-category-stats 命令"""
+    global _listeners_installed
+
+    @app.cli.command('rebuild-category-stats')
+    def rebuild_category_stats_command():
+        """按物品表重新统计各分类的可用物品数"""
+        count = rebuild_category_stats()
+        click.echo(f"分类物品计数已重建，共 {count} 个分类有可用物品")
+
+    with _install_lock:
+        if _listeners_installed:
+            return
+        event.listen(Session, 'before_flush', _on_before_flush)
+        _listeners_installed = True
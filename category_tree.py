@@ -0,0 +1,118 @@
+import threading
+from types import MappingProxyType
+from sqlalchemy import select
+from versions import version_stamps
+
+
+class CategoryTreeSnapshot:
+    """某一版本全部分类的只读快照
+
+    包含名称、父分类、子分类列表（按分类ID排序）和从根分类开始的完整路径，
+    构建后不再修改，多个线程可以不加锁同时读取。
+    """
+
+    def __init__(self, version, rows):
+        self.version = version
+        names = {}
+        parents = {}
+        children = {}
+        for category_id, name, parent_id in sorted(rows, key=lambda row: row[0]):
+            names[category_id] = name
+            parents[category_id] = parent_id
+            children.setdefault(parent_id, []).append(category_id)
+
+        ancestors = {}
+        for category_id in names:
+            chain = []
+            current = category_id
+            # 正常数据中没有环，visited 只是防止脏数据导致死循环
+            visited = set()
+            while current is not None and current not in visited and current not in ancestors:
+                visited.add(current)
+                chain.append(current)
+                current = parents.get(current)
+            prefix = ancestors.get(current, ())
+            for index in range(len(chain) - 1, -1, -1):
+                prefix = prefix + (chain[index],)
+                ancestors[chain[index]] = prefix
+
+        self.names = MappingProxyType(names)
+        self.parents = MappingProxyType(parents)
+        self.children = MappingProxyType({key: tuple(value) for key, value in children.items()})
+        self.ancestors = MappingProxyType(ancestors)  # 分类ID -> 从根分类到自身的ID元组
+        self.full_paths = MappingProxyType({
+            category_id: ' > '.join(names[ancestor_id] for ancestor_id in chain)
+            for category_id, chain in ancestors.items()
+        })
+
+    def __contains__(self, category_id):
+        return category_id in self.names
+
+    def roots(self):
+        """根分类ID"""
+        return self.children.get(None, ())
+
+    def children_of(self, category_id):
+        """直接子分类ID"""
+        return self.children.get(category_id, ())
+
+    def is_descendant(self, category_id, ancestor_id):
+        """category_id 是否是 ancestor_id 自身或它的后代"""
+        return ancestor_id in self.ancestors.get(category_id, ())
+
+    def search(self, keyword):
+        """名称包含关键词（不区分大小写）的分类ID"""
+        keyword = keyword.casefold()
+        return [category_id for category_id, name in self.names.items() if keyword in name.casefold()]
+
+    def to_dict(self, category_id):
+        """与 ItemCategory.to_dict() 相同的字典"""
+        return {
+            'category_id': category_id,
+            'name': self.names[category_id],
+            'parent_id': self.parents[category_id]
+        }
+
+
+class CategoryTree:
+    """进程内的分类树缓存
+
+    以 item_category 表的版本号为键：分类的增删改提交后版本号加一，
+    下一次读取时重新加载；版本号没变时直接返回现有快照，不查询数据库。
+    多进程部署时与 ETag 一样需要配置共享的版本号后端，其他进程的修改才会让本进程的快照失效。
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._snapshot = None
+
+    def snapshot(self):
+        """返回当前版本的分类树快照"""
+        # 先读版本号再加载数据：加载期间有新的提交时，快照带的是旧版本号，下次读取会再次加载
+        version = version_stamps.stamp('item_category')
+        snapshot = self._snapshot
+        if snapshot is not None and snapshot.version == version:
+            return snapshot
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and snapshot.version == version:
+                return snapshot
+            from models import ItemCategory, db
+            # 在新的连接上读取：调用方会话中尚未提交的分类修改不能进入所有请求共享的快照，
+            # 会话早已开启的事务（MySQL 可重复读）也可能读到版本号之前的旧数据
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(ItemCategory.category_id, ItemCategory.name, ItemCategory.parent_id)
+                ).all()
+            snapshot = CategoryTreeSnapshot(version, rows)
+            self._snapshot = snapshot
+            return snapshot
+
+    def reset(self):
+        """丢弃快照，下次读取时重新加载"""
+        with self._lock:
+            self._snapshot = None
+
+
+# 全局分类树缓存实例
+category_tree = CategoryTree()
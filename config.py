@@ -37,6 +37,9 @@ class Config:
         'pool_timeout': 20,
         'max_overflow': 0
     }
+    # 每个请求允许执行的SQL次数，超出时记录警告并在响应头 X-Query-Count 中返回实际次数。
+    # 列表接口使用批量序列化后，每页的查询次数是固定的，与每页条数无关。None 表示不统计。
+    QUERY_BUDGET = None
     # ----------------- JWT 配置 (JWT Configuration) -----------------
     # JWT (JSON Web Token) 是我们用来做用户登录认证的。
     JWT_SECRET_KEY = os.environ.get('JWT_SECRET_KEY') or 'jwt-secret-string'
@@ -48,6 +51,56 @@ class Config:
     UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'uploads')
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024  # 16MB
     ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
+    # 生成缩略图和 WebP 版本的后台线程数，0 表示不生成
+    IMAGE_VARIANT_WORKERS = 2
+    IMAGE_VARIANT_QUALITY = 80
+    # 分片上传：单个文件的大小上限和建议的分片大小。每个分片仍受 MAX_CONTENT_LENGTH 限制。
+    UPLOAD_MAX_SIZE = 16 * 1024 * 1024
+    UPLOAD_CHUNK_SIZE = 1024 * 1024
+    # 多图上传：一次最多上传的文件数（与发布物品的图片数上限一致）和并发保存的线程数
+    UPLOAD_BATCH_MAX = 10
+    UPLOAD_WORKERS = 4
+    # 上传图片的发送：内容寻址的文件名缓存一年，旧的随机文件名缓存 UPLOAD_CACHE_MAX_AGE 秒，
+    # 衍生版本还没生成、临时发送原图时缓存 UPLOAD_FALLBACK_MAX_AGE 秒。
+    # 由前端服务器发送文件内容：Apache/lighttpd 设置 Flask 的 USE_X_SENDFILE = True；
+    # nginx 把 UPLOAD_ACCEL_REDIRECT 设为指向 static/uploads 的 internal location（如 '/_uploads/'）。
+    UPLOAD_CACHE_MAX_AGE = 3600
+    UPLOAD_FALLBACK_MAX_AGE = 60
+    UPLOAD_ACCEL_REDIRECT = None
+    # 孤立上传文件清理：未被物品引用的文件超过宽限期（小时）才删除，分片上传会话超过期限没有更新时删除。
+    # 可以用 cron 定时执行 `flask gc-uploads`，也可以设置 UPLOAD_GC_INTERVAL_HOURS 在应用进程内定时清理，None 表示不启用
+    UPLOAD_GC_GRACE_HOURS = 24
+    UPLOAD_SESSION_EXPIRE_HOURS = 24
+    UPLOAD_GC_INTERVAL_HOURS = None
+    
+    # ----------------- 附近物品配置 (Geo Configuration) -----------------
+    # 是否使用进程内的 geohash 空间索引。关闭后附近物品查询改由数据库按 (latitude, longitude)
+    # 复合索引做包围盒预筛选，只对框内的物品计算精确距离，适合内存紧张或多进程不便维护索引的部署。
+    GEO_INDEX_ENABLED = True
+    
+    # ----------------- 缓存配置 (Cache Configuration) -----------------
+    # 物品详情缓存：进程内LRU的容量和过期时间（秒），ITEM_CACHE_TTL 为 0 时关闭缓存。
+    ITEM_CACHE_SIZE = 2048
+    ITEM_CACHE_TTL = 300
+    # 进程内缓存的过期时间，None 表示与 ITEM_CACHE_TTL 相同。
+    # 多进程部署时各进程的本地缓存无法互相失效，建议配置共享后端并把这个值调小。
+    ITEM_CACHE_LOCAL_TTL = None
+    # 共享缓存后端：None 表示不使用，'local' 使用进程内替身，也可以直接传入 redis.Redis 实例。
+    CACHE_SHARED_BACKEND = None
+    # 没有共享后端时是否仍按进程内的版本计数器返回304。单进程运行时计数器是准确的；
+    # 多进程部署（如 gunicorn 多个 worker）时其他进程的写入不会改变本进程的计数器，必须关闭或配置共享后端。
+    ETAG_WITH_LOCAL_VERSIONS = True
+    # 物品列表分面统计缓存，键中包含物品表的版本号，数据变化后旧条目自然失效。
+    FACET_CACHE_SIZE = 512
+    FACET_CACHE_TTL = 60
+    
+    # ----------------- 批量接口配置 (Bulk Configuration) -----------------
+    # 批量发布物品和批量修改状态时单次请求的最大条数
+    BULK_ITEMS_MAX = 500
+    # 流式导出时服务端游标每批读取的行数
+    EXPORT_BATCH_SIZE = 1000
+    # 每个用户最多保存的搜索数量
+    SAVED_SEARCHES_MAX = 20
     
     # ----------------- CORS 配置 (CORS Configuration) -----------------
     # CORS_ORIGINS 是一个列表，里面包含了允许访问我们后端API的前端服务器地址。
@@ -63,11 +116,15 @@ class DevelopmentConfig(Config):
     """开发环境配置"""
     # 开启调试模式，这样代码改动后服务器会自动重启，并且出错时会显示详细信息。
     DEBUG = True
+    # 开发时统计每个请求的查询次数，方便发现 N+1 查询
+    QUERY_BUDGET = 20
     
 class ProductionConfig(Config):
     """生产（线上）环境配置"""
     # 线上环境必须关闭调试模式！
     DEBUG = False
+    # 线上以多个 worker 部署，没有配置共享后端时不按进程内的版本计数器返回304
+    ETAG_WITH_LOCAL_VERSIONS = False
     
 class TestingConfig(Config):
     """测试环境配置"""
@@ -0,0 +1,322 @@
+import math
+import threading
+import numpy as np
+from sqlalchemy import select
+from versions import VersionTracker
+
+# geohash 使用的 base32 字符表
+_BASE32 = '0123456789bcdefghjkmnpqrstuvwxyz'
+
+# 数据库中保存的 geohash 精度（9位约为 4.8m x 4.8m）
+GEOHASH_PRECISION = 9
+# 内存索引中维护的最细网格精度（7位约为 153m x 153m）
+INDEX_PRECISION = 7
+# 地球半径（公里），与 utils.calculate_distance 保持一致
+EARTH_RADIUS_KM = 6371
+# 每度纬度对应的公里数
+KM_PER_DEGREE = math.pi * EARTH_RADIUS_KM / 180
+
+
+def encode_geohash(latitude, longitude, precision=GEOHASH_PRECISION):
+    """将经纬度编码为 geohash 字符串"""
+    latitude = float(latitude)
+    longitude = float(longitude)
+    lat_range = [-90.0, 90.0]
+    lon_range = [-180.0, 180.0]
+    chars = []
+    bits = 0
+    bit_count = 0
+    even = True
+
+    while len(chars) < precision:
+        # 偶数位编码经度，奇数位编码纬度
+        value, value_range = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (value_range[0] + value_range[1]) / 2
+        if value >= mid:
+            bits = bits * 2 + 1
+            value_range[0] = mid
+        else:
+            bits = bits * 2
+            value_range[1] = mid
+        even = not even
+
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits = 0
+            bit_count = 0
+
+    return ''.join(chars)
+
+
+def cell_size(precision):
+    """返回指定精度下网格的 (纬度跨度, 经度跨度)，单位为度"""
+    lon_bits = (5 * precision + 1) // 2
+    lat_bits = 5 * precision // 2
+    return 180.0 / (1 << lat_bits), 360.0 / (1 << lon_bits)
+
+
+def haversine(lat1, lon1, lat2, lon2):
+    """计算两点间球面距离（公里），参数为角度"""
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + \
+        math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(1.0, a)))
+
+
+def haversine_many(latitude, longitude, lats, lons, cos_lats):
+    """批量计算一个点到多个点的球面距离（公里）
+
+    latitude/longitude 为角度，lats/lons 为弧度数组，cos_lats 为 cos(lats)，空槽位（NaN）得到 NaN。
+    """
+    lat = math.radians(latitude)
+    lon = math.radians(longitude)
+    a = np.sin((lats - lat) / 2) ** 2 + \
+        math.cos(lat) * cos_lats * np.sin((lons - lon) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(1.0, a)))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """返回完整包含查询圆的经纬度矩形 (最小纬度, 最大纬度, [(最小经度, 最大经度), ...])
+
+    跨越 ±180 经线时经度区间拆成两段，覆盖到极点时经度不受限制。
+    """
+    latitude = float(latitude)
+    longitude = float(longitude)
+    dlat = radius_km / KM_PER_DEGREE
+    min_lat = latitude - dlat
+    max_lat = latitude + dlat
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), [(-180.0, 180.0)]
+
+    # 按离赤道最远的纬度估算经度跨度，保证矩形不会漏掉圆内的点
+    dlon = dlat / math.cos(math.radians(max(abs(min_lat), abs(max_lat))))
+    if dlon >= 180:
+        return min_lat, max_lat, [(-180.0, 180.0)]
+    min_lon = longitude - dlon
+    max_lon = longitude + dlon
+    if min_lon < -180:
+        return min_lat, max_lat, [(min_lon + 360, 180.0), (-180.0, max_lon)]
+    if max_lon > 180:
+        return min_lat, max_lat, [(min_lon, 180.0), (-180.0, max_lon - 360)]
+    return min_lat, max_lat, [(min_lon, max_lon)]
+
+
+def _query_precision(latitude, radius_km):
+    """选择能让 3x3 邻域网格完整覆盖查询圆的最细精度，覆盖不了时返回 None"""
+    dlat = radius_km / KM_PER_DEGREE
+    # 取查询范围内离赤道最远的纬度，保证经度方向的覆盖足够保守
+    extreme_lat = min(90.0, abs(latitude) + dlat)
+    cos_lat = math.cos(math.radians(extreme_lat))
+    if cos_lat <= 1e-9:
+        return None
+    dlon = dlat / cos_lat
+
+    for precision in range(INDEX_PRECISION, 0, -1):
+        lat_span, lon_span = cell_size(precision)
+        if lat_span >= dlat and lon_span >= dlon:
+            return precision
+    return None
+
+
+def _covering_cells(latitude, longitude, precision):
+    """返回查询点所在网格及其8个相邻网格"""
+    lat_span, lon_span = cell_size(precision)
+    cells = set()
+    for dy in (-1, 0, 1):
+        lat = latitude + dy * lat_span
+        if lat < -90 or lat > 90:
+            continue
+        for dx in (-1, 0, 1):
+            lon = longitude + dx * lon_span
+            # 经度跨越 ±180 时回绕
+            lon = (lon + 180.0) % 360.0 - 180.0
+            cells.add(encode_geohash(lat, lon, precision))
+    return cells
+
+
+class GeoIndex:
+    """进程内的 geohash 网格索引
+
+    每个物品按 1..INDEX_PRECISION 各级 geohash 前缀登记到对应网格中，
+    半径查询时根据半径挑选合适的网格精度，只取 3x3 邻域内的候选物品做精确距离计算。
+    坐标另外保存在 NumPy 数组中，候选物品的距离计算、半径过滤和取最近的前K个都是一次向量化运算。
+    索引在首次查询时从数据库加载，之后由物品的增删改接口增量维护；
+    物品表的版本号变化（其他进程提交了物品的写入）时重新加载。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._tracker = VersionTracker('item')
+        self._points = {}  # item_id -> (latitude, longitude, geohash)
+        self._cells = [dict() for _ in range(INDEX_PRECISION + 1)]  # precision -> {prefix: set(item_id)}
+        self._reset_arrays()
+
+    def _reset_arrays(self):
+        # 坐标数组按槽位存放，删除的物品留下空槽位（ID为-1、坐标为NaN）供后续复用
+        self._slots = {}  # item_id -> 槽位
+        self._free = []
+        self._size = 0
+        self._ids = np.full(0, -1, dtype=np.int64)
+        self._lats = np.full(0, np.nan)  # 弧度
+        self._lons = np.full(0, np.nan)  # 弧度
+        self._cos_lats = np.full(0, np.nan)
+
+    def ensure_loaded(self):
+        """首次使用或物品表的版本号变化时，从数据库加载所有带坐标的物品"""
+        if self._loaded and self._tracker.is_current():
+            return
+        with self._lock:
+            # 先读版本号再加载数据：加载期间有新的提交时，记下的是旧版本号，下次使用时会再次加载。
+            # 数据在新的连接上读取：请求的会话可能早已开启事务，MySQL 可重复读隔离级别下
+            # 读到的是版本号之前的快照，记下新版本号后索引会一直停留在旧数据上
+            version = self._tracker.current()
+            if self._loaded and self._tracker.seen == version:
+                return
+            self._clear()
+            from models import Item, db
+            with db.engine.connect() as connection:
+                rows = connection.execute(
+                    select(Item.item_id, Item.latitude, Item.longitude, Item.geohash).where(
+                        Item.latitude.isnot(None),
+                        Item.longitude.isnot(None)
+                    )
+                ).all()
+            for item_id, latitude, longitude, geohash in rows:
+                self._add(item_id, float(latitude), float(longitude), geohash)
+            self._tracker.mark(version)
+            self._loaded = True
+
+    def reset(self):
+        """清空索引，下次查询时重新加载"""
+        with self._lock:
+            self._clear()
+            self._tracker.reset()
+            self._loaded = False
+
+    def _clear(self):
+        self._points.clear()
+        for cells in self._cells:
+            cells.clear()
+        self._reset_arrays()
+
+    def upsert(self, item_id, latitude, longitude):
+        """新增或更新物品坐标，坐标为空时从索引中移除"""
+        with self._lock:
+            if not self._loaded:
+                # 尚未加载时无需维护，加载时会直接读取数据库中的最新数据
+                return
+            self._remove(item_id)
+            if latitude is not None and longitude is not None:
+                self._add(item_id, float(latitude), float(longitude))
+            self._tracker.advance()
+
+    def remove(self, item_id):
+        """从索引中移除物品"""
+        with self._lock:
+            if self._loaded:
+                self._remove(item_id)
+                self._tracker.advance()
+
+    def advance(self):
+        """本进程提交的物品写入没有改动坐标（如只修改了状态）时调用，把索引记为最新，不必重新加载"""
+        with self._lock:
+            if self._loaded:
+                self._tracker.advance()
+
+    def query_radius(self, latitude, longitude, radius_km):
+        """返回半径内的物品 [(item_id, 距离公里)]，按距离升序排列"""
+        return self.nearest(latitude, longitude, radius_km)[0]
+
+    def nearest(self, latitude, longitude, radius_km=None, limit=None):
+        """按距离升序返回 ([(item_id, 距离公里)], 命中总数)
+
+        radius_km 为 None 时不限距离；limit 不为 None 时只对最近的 limit 个物品排序返回，
+        命中总数仍是半径内的全部物品数。
+        """
+        self.ensure_loaded()
+        latitude = float(latitude)
+        longitude = float(longitude)
+
+        with self._lock:
+            precision = None if radius_km is None else _query_precision(latitude, radius_km)
+            if precision is None:
+                slots = slice(0, self._size)
+            else:
+                candidates = set()
+                for cell in _covering_cells(latitude, longitude, precision):
+                    candidates.update(self._cells[precision].get(cell, ()))
+                slots = np.fromiter((self._slots[item_id] for item_id in candidates),
+                                    dtype=np.intp, count=len(candidates))
+            # 花式索引和切片后的计算结果都是新数组，释放锁后不受并发修改影响
+            ids = self._ids[slots]
+            distances = haversine_many(latitude, longitude, self._lats[slots],
+                                       self._lons[slots], self._cos_lats[slots])
+
+        # NaN（空槽位）与任何值比较都为 False，在这里一并过滤掉
+        if radius_km is None:
+            mask = ~np.isnan(distances)
+        else:
+            mask = distances <= radius_km
+        ids = ids[mask]
+        distances = distances[mask]
+        total = len(ids)
+
+        if limit is not None and limit < total:
+            # 先用 O(n) 的选择算法取出最近的 limit 个，只对它们排序
+            nearest = np.argpartition(distances, max(limit - 1, 0))[:limit]
+            order = nearest[np.lexsort((ids[nearest], distances[nearest]))]
+        else:
+            order = np.lexsort((ids, distances))
+
+        return list(zip(ids[order].tolist(), distances[order].tolist())), total
+
+    def _add(self, item_id, latitude, longitude, geohash=None):
+        if not geohash or len(geohash) < INDEX_PRECISION:
+            geohash = encode_geohash(latitude, longitude)
+        self._points[item_id] = (latitude, longitude, geohash)
+        for precision in range(1, INDEX_PRECISION + 1):
+            self._cells[precision].setdefault(geohash[:precision], set()).add(item_id)
+
+        if self._free:
+            slot = self._free.pop()
+        else:
+            if self._size == len(self._ids):
+                self._grow()
+            slot = self._size
+            self._size += 1
+        self._slots[item_id] = slot
+        self._ids[slot] = item_id
+        self._lats[slot] = math.radians(latitude)
+        self._lons[slot] = math.radians(longitude)
+        self._cos_lats[slot] = math.cos(self._lats[slot])
+
+    def _grow(self):
+        """坐标数组容量翻倍"""
+        capacity = max(1024, 2 * len(self._ids))
+        for name, fill in (('_ids', -1), ('_lats', np.nan), ('_lons', np.nan), ('_cos_lats', np.nan)):
+            old = getattr(self, name)
+            new = np.full(capacity, fill, dtype=old.dtype)
+            new[:len(old)] = old
+            setattr(self, name, new)
+
+    def _remove(self, item_id):
+        point = self._points.pop(item_id, None)
+        if point is None:
+            return
+        slot = self._slots.pop(item_id)
+        self._ids[slot] = -1
+        self._lats[slot] = self._lons[slot] = self._cos_lats[slot] = np.nan
+        self._free.append(slot)
+        geohash = point[2]
+        for precision in range(1, INDEX_PRECISION + 1):
+            cell = self._cells[precision].get(geohash[:precision])
+            if cell is not None:
+                cell.discard(item_id)
+                if not cell:
+                    del self._cells[precision][geohash[:precision]]
+
+
+# 全局空间索引实例
+geo_index = GeoIndex()
@@ -0,0 +1,118 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# 上传图片的衍生版本：缩略图和中图按最长边缩放，另外每个尺寸（包括原图）都生成一份 WebP。
+# 衍生文件与原图放在同一目录，文件名为 <原文件名>_<尺寸>.<扩展名>，
+# 由原图URL即可推出，不需要额外的数据库字段。
+VARIANT_SIZES = {
+    'thumb': 320,
+    'medium': 960,
+}
+# 只有这些格式会生成衍生版本（GIF 可能是动图，保持原样）
+VARIANT_SOURCE_EXTENSIONS = {'.jpg', '.jpeg', '.png'}
+UPLOAD_URL_PREFIX = '/static/uploads/'
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def _split(url_or_path):
+    stem, ext = os.path.splitext(url_or_path)
+    return stem, ext.lower()
+
+
+def variant_urls(image_url):
+    """返回图片各衍生版本的URL，非本站上传或不支持的格式返回空字典"""
+    if not image_url or not image_url.startswith(UPLOAD_URL_PREFIX):
+        return {}
+    stem, ext = _split(image_url)
+    if ext not in VARIANT_SOURCE_EXTENSIONS:
+        return {}
+    urls = {'webp': f'{stem}.webp'}
+    for name in VARIANT_SIZES:
+        urls[name] = f'{stem}_{name}{ext}'
+        urls[f'{name}_webp'] = f'{stem}_{name}.webp'
+    return urls
+
+
+def variant_paths(path):
+    """返回原图文件各衍生版本的 {名称: (文件路径, 最长边或None, 格式)}"""
+    stem, ext = _split(path)
+    if ext not in VARIANT_SOURCE_EXTENSIONS:
+        return {}
+    paths = {'webp': (f'{stem}.webp', None, 'WEBP')}
+    for name, size in VARIANT_SIZES.items():
+        paths[name] = (f'{stem}_{name}{ext}', size, 'JPEG' if ext in ('.jpg', '.jpeg') else 'PNG')
+        paths[f'{name}_webp'] = (f'{stem}_{name}.webp', size, 'WEBP')
+    return paths
+
+
+def variant_sources(path):
+    """衍生版本对应的原图候选路径，衍生版本还没生成时用原图代替；不是衍生版本时返回空列表"""
+    stem, ext = _split(path)
+    for name in VARIANT_SIZES:
+        if stem.endswith(f'_{name}'):
+            stem = stem[:-len(name) - 1]
+            break
+    else:
+        if ext != '.webp':
+            return []
+    if ext == '.webp':
+        return [f'{stem}{source_ext}' for source_ext in sorted(VARIANT_SOURCE_EXTENSIONS)]
+    return [f'{stem}{ext}']
+
+
+def generate_variants(path, quality=80):
+    """生成原图的全部衍生版本，已存在的跳过；返回生成的文件路径列表"""
+    from PIL import Image, ImageOps
+
+    targets = {name: target for name, target in variant_paths(path).items() if not os.path.exists(target[0])}
+    if not targets:
+        return []
+
+    generated = []
+    with Image.open(path) as source:
+        # 按 EXIF 方向摆正，手机照片经常是旋转保存的
+        source = ImageOps.exif_transpose(source)
+        for target_path, size, image_format in targets.values():
+            image = source.copy()
+            if size:
+                image.thumbnail((size, size), Image.LANCZOS)
+            if image_format == 'JPEG' and image.mode not in ('RGB', 'L'):
+                image = image.convert('RGB')
+
+            # 先写临时文件再改名，读取方不会看到写了一半的图片
+            temp_path = f'{target_path}.tmp'
+            image.save(temp_path, format=image_format, quality=quality, optimize=True)
+            os.replace(temp_path, target_path)
+            generated.append(target_path)
+    return generated
+
+
+def _get_executor(max_workers):
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='image-variants')
+    return _executor
+
+
+def _generate_logged(path, quality, logger):
+    try:
+        return generate_variants(path, quality)
+    except Exception as e:
+        logger.warning('生成图片衍生版本失败 %s: %s', path, e)
+        return []
+
+
+def schedule_variants(path, app):
+    """把衍生版本的生成提交到后台线程池，不阻塞上传请求；返回 Future，未启用时返回 None"""
+    if _split(path)[1] not in VARIANT_SOURCE_EXTENSIONS:
+        return None
+    workers = app.config.get('IMAGE_VARIANT_WORKERS', 2)
+    if not workers:
+        return None
+    quality = app.config.get('IMAGE_VARIANT_QUALITY', 80)
+    return _get_executor(workers).submit(_generate_logged, path, quality, app.logger)
@@ -1,10 +1,303 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app, Response, stream_with_context
 from models import Item, ItemImage, ItemCategory, User, db
-from utils import success_response, error_response, validate_required_fields, get_current_user, paginate_query, calculate_distance
-from sqlalchemy import or_, and_
+from utils import success_response, error_response, validate_required_fields, get_current_user, paginate_query, calculate_distance, normalize_pagination, build_pagination, paginate_keyset, is_valid_cursor, make_etag, etag_response, versioned
+from geo_index import geo_index, bounding_box, haversine_many
+from search_index import search_index
+from suggest_index import suggest_index
+from saved_searches import notify_saved_searches
+from serializers import serialize_items, ITEM_FIELDS, parse_fields, load_fields
+from cache import item_cache, facet_cache
+from versions import version_stamps, item_version_names
+from category_stats import apply_category_deltas
+from sqlalchemy import or_, and_, func, insert
+import csv
+import numpy as np
+import io
+import json
 
 items_bp = Blueprint('items', __name__, url_prefix='/api/v1/items')
 
+def refresh_item_indexes(item):
+    """物品写入提交后，同步更新进程内索引并使详情缓存失效"""
+    geo_index.upsert(item.item_id, item.latitude, item.longitude)
+    search_index.upsert(item.item_id, item.title, item.description)
+    suggest_index.upsert_item(item.item_id, item.title)
+    item_cache.delete(item.item_id)
+
+def remove_item_indexes(item_id):
+    """物品删除提交后，从进程内索引中移除并使详情缓存失效"""
+    geo_index.remove(item_id)
+    search_index.remove(item_id)
+    suggest_index.remove_item(item_id)
+    item_cache.delete(item_id)
+
+def touch_item_indexes():
+    """物品写入提交后，改动的字段不在进程内索引中（状态、主图）时调用，把索引记为最新，避免下次使用时整体重新加载"""
+    search_index.advance()
+    geo_index.advance()
+    suggest_index.advance()
+
+def viewer_key():
+    """影响列表内容的查看者信息（用户ID和位置），参与 ETag 计算"""
+    current_user = get_current_user()
+    if not current_user:
+        return None
+    return current_user.user_id, current_user.latitude, current_user.longitude
+
+# 支持分面统计的筛选维度
+FACET_COLUMNS = {
+    'category_id': Item.category_id,
+    'condition': Item.condition,
+    'status': Item.status,
+    'user_id': Item.user_id,
+}
+
+def parse_facets(value):
+    """解析逗号分隔的 facets 参数，包含不支持的维度时抛出 ValueError"""
+    dimensions = list(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+    unknown = [name for name in dimensions if name not in FACET_COLUMNS]
+    if unknown:
+        raise ValueError(f"不支持的统计维度: {', '.join(unknown)}")
+    return dimensions
+
+def count_facets(query, dimensions):
+    """在当前筛选条件下统计各维度取值对应的物品数量
+
+    所有维度联合分组只执行一条 GROUP BY 查询，再在内存中对每个维度分别求和。
+    """
+    columns = [FACET_COLUMNS[name] for name in dimensions]
+    rows = query.with_entities(*columns, func.count(Item.item_id))\
+        .group_by(*columns).order_by(None).all()
+    
+    counts = {name: {} for name in dimensions}
+    for row in rows:
+        count = row[-1]
+        for index, name in enumerate(dimensions):
+            counts[name][row[index]] = counts[name].get(row[index], 0) + count
+    
+    return {
+        name: [
+            {'value': value, 'count': count}
+            for value, count in sorted(values.items(), key=lambda x: (-x[1], str(x[0])))
+        ]
+        for name, values in counts.items()
+    }
+
+def get_facets(query, dimensions, signature):
+    """按筛选条件签名缓存分面统计结果，签名中带有物品表版本号，物品变化后自动失效"""
+    key = make_etag(version_stamps.stamp('item'), dimensions, signature)
+    return facet_cache.get_or_load(key, lambda: count_facets(query, dimensions))
+
+# 物品成色和可由用户设置的状态
+ITEM_CONDITIONS = ['new', 'like_new', 'used', 'worn']
+ITEM_STATUSES = ['available', 'reserved', 'completed', 'cancelled']
+
+def parse_category_id(value):
+    """把请求中的分类ID转为整数，接受整数和数字字符串（如 "3"），格式不正确时返回 None"""
+    if isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value
+    if isinstance(value, str) and value.strip().isdigit():
+        return int(value.strip())
+    return None
+
+def validate_item_data(data, category_exists):
+    """校验发布物品的数据，返回 (字段字典, 错误信息)
+
+    category_exists 为判断分类是否存在的函数，单条发布时查库，批量发布时查预加载的分类集合。
+    """
+    # 验证必需字段
+    required_fields = ['title', 'description', 'category_id', 'condition']
+    validation_error = validate_required_fields(data, required_fields)
+    if validation_error:
+        return None, validation_error
+    
+    title = data['title'].strip()
+    description = data['description'].strip()
+    category_id = parse_category_id(data['category_id'])
+    condition = data['condition']
+    image_urls = data.get('image_urls', [])
+    latitude = data.get('latitude')
+    longitude = data.get('longitude')
+    
+    # 验证数据格式
+    if len(title) < 1 or len(title) > 100:
+        return None, "物品标题长度必须在1-100个字符之间"
+    
+    if len(description) < 1 or len(description) > 1000:
+        return None, "物品描述长度必须在1-1000个字符之间"
+    
+    if condition not in ITEM_CONDITIONS:
+        return None, "物品状态必须是: new, like_new, used, worn 之一"
+    
+    # 验证分类是否存在
+    if category_id is None:
+        return None, "分类ID格式不正确"
+    if not category_exists(category_id):
+        return None, "分类不存在"
+    
+    # 验证图片URL
+    if not image_urls or len(image_urls) == 0:
+        return None, "至少需要上传一张图片"
+    
+    if len(image_urls) > 10:
+        return None, "最多只能上传10张图片"
+    
+    # 验证经纬度
+    if latitude is not None and longitude is not None:
+        try:
+            latitude = float(latitude)
+            longitude = float(longitude)
+            if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
+                return None, "经纬度范围不正确"
+        except (ValueError, TypeError):
+            return None, "经纬度格式不正确"
+    else:
+        latitude = longitude = None
+    
+    return {
+        'title': title,
+        'description': description,
+        'category_id': category_id,
+        'condition': condition,
+        'image_urls': [image_url.strip() for image_url in image_urls],
+        'latitude': latitude,
+        'longitude': longitude
+    }, None
+
+def sync_item_images(item, image_urls):
+    """按URL对比现有图片和目标图片，只插入新增的、删除移除的，并就地修正主图标记
+
+    同一URL出现多次时按多重集合逐个匹配；第一张目标图片为主图。
+    """
+    item_id = item.item_id
+    item.primary_image_url = image_urls[0]
+    existing = {}
+    for image in ItemImage.query.filter_by(item_id=item_id).order_by(ItemImage.image_id).all():
+        existing.setdefault(image.image_url, []).append(image)
+    
+    for i, image_url in enumerate(image_urls):
+        is_primary = (i == 0)
+        matched = existing.get(image_url)
+        if matched:
+            image = matched.pop(0)
+            # 只有取值变化时才会生成 UPDATE
+            if image.is_primary != is_primary:
+                image.is_primary = is_primary
+        else:
+            db.session.add(ItemImage(item_id=item_id, image_url=image_url, is_primary=is_primary))
+    
+    # 没有匹配上的旧图片
+    for images in existing.values():
+        for image in images:
+            db.session.delete(image)
+
+def filter_items(query, category_id=None, condition=None, status=None, user_id=None, search=None):
+    """套用物品列表的筛选条件，返回 (查询, 搜索命中的物品ID)
+
+    搜索命中的物品ID按相关度排序；没有搜索或退化为子串匹配时为 None。
+    """
+    # 状态筛选
+    if status:
+        query = query.filter(Item.status == status)
+    
+    # 分类筛选
+    if category_id:
+        query = query.filter(Item.category_id == category_id)
+    
+    # 新旧程度筛选
+    if condition:
+        query = query.filter(Item.condition == condition)
+    
+    # 用户筛选
+    if user_id:
+        query = query.filter(Item.user_id == user_id)
+    
+    # 搜索功能：通过倒排索引取得按相关度排序的物品ID，
+    # 查询词中没有可索引的词元时才退化为子串匹配
+    search_ids = None
+    if search:
+        search_ids = search_index.search(search)
+        if search_ids is None:
+            query = query.filter(
+                or_(
+                    Item.title.contains(search),
+                    Item.description.contains(search)
+                )
+            )
+        else:
+            query = query.filter(Item.item_id.in_(search_ids))
+    
+    return query, search_ids
+
+def within_bounding_box(latitude, longitude, radius_km):
+    """查询圆的包围盒条件，BETWEEN 形式可以使用 (latitude, longitude) 复合索引"""
+    min_lat, max_lat, lon_ranges = bounding_box(latitude, longitude, radius_km)
+    return and_(
+        Item.latitude.between(min_lat, max_lat),
+        or_(*(Item.longitude.between(min_lon, max_lon) for min_lon, max_lon in lon_ranges))
+    )
+
+def nearby_from_database(query, latitude, longitude, radius_km=None):
+    """不使用空间索引时的附近物品查询，返回 [(item_id, 距离公里)]，按距离升序排列
+
+    数据库先用包围盒排除绝大部分物品，只取框内物品的坐标，再向量化计算精确距离。
+    radius_km 为 None 时不限距离，取所有有坐标的物品。
+    """
+    query = query.with_entities(Item.item_id, Item.latitude, Item.longitude)\
+        .filter(Item.latitude.isnot(None), Item.longitude.isnot(None)).order_by(None)
+    if radius_km is not None:
+        query = query.filter(within_bounding_box(latitude, longitude, radius_km))
+    rows = query.all()
+    if not rows:
+        return []
+    
+    ids = np.array([row[0] for row in rows], dtype=np.int64)
+    lats = np.radians(np.array([float(row[1]) for row in rows]))
+    lons = np.radians(np.array([float(row[2]) for row in rows]))
+    distances = haversine_many(float(latitude), float(longitude), lats, lons, np.cos(lats))
+    if radius_km is not None:
+        mask = distances <= radius_km
+        ids = ids[mask]
+        distances = distances[mask]
+    order = np.lexsort((ids, distances))
+    return list(zip(ids[order].tolist(), distances[order].tolist()))
+
+def parse_item_fields(args):
+    """解析物品列表的 fields 和 include_images 参数，包含未知字段时抛出 ValueError"""
+    fields = parse_fields(args.get('fields'), ITEM_FIELDS, 'item_id')
+    if args.get('include_images', 'true').lower() == 'false':
+        # 不查询图片表的列表模式，只用物品表上冗余的 primary_image_url
+        if fields is None:
+            fields = set(ITEM_FIELDS)
+        fields.discard('images')
+    return fields
+
+def paginate_ranked(ranked_ids, page=1, per_page=20, extras=None, fields=None, total=None):
+    """对已排好序的物品ID列表分页，只加载当前页的物品
+
+    ranked_ids 只包含前几页时通过 total 传入实际的命中总数。
+    """
+    page, per_page = normalize_pagination(page, per_page)
+    page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+    
+    items_by_id = {}
+    if page_ids:
+        query = load_fields(Item.query.filter(Item.item_id.in_(page_ids)), Item, ITEM_FIELDS, fields)
+        items_by_id = {item.item_id: item for item in query.all()}
+    page_items = [items_by_id[item_id] for item_id in page_ids if item_id in items_by_id]
+    
+    items_data = serialize_items(page_items, fields=fields)
+    if extras:
+        for item_data in items_data:
+            item_data.update(extras.get(item_data['item_id'], {}))
+    
+    return {
+        'items': items_data,
+        'pagination': build_pagination(page, per_page, len(ranked_ids) if total is None else total)
+    }
+
 @items_bp.route('', methods=['POST'])
 def create_item():
     """发布新物品"""
@@ -16,78 +309,38 @@ def create_item():
         if not data:
             return error_response("请求数据不能为空")
         
-        # 验证必需字段
-        required_fields = ['title', 'description', 'category_id', 'condition']
-        validation_error = validate_required_fields(data, required_fields)
+        fields, validation_error = validate_item_data(
+            data, lambda category_id: ItemCategory.query.get(category_id) is not None
+        )
         if validation_error:
             return error_response(validation_error)
         
-        title = data['title'].strip()
-        description = data['description'].strip()
-        category_id = data['category_id']
-        condition = data['condition']
-        image_urls = data.get('image_urls', [])
-        latitude = data.get('latitude')
-        longitude = data.get('longitude')
-        
-        # 验证数据格式
-        if len(title) < 1 or len(title) > 100:
-            return error_response("物品标题长度必须在1-100个字符之间")
-        
-        if len(description) < 1 or len(description) > 1000:
-            return error_response("物品描述长度必须在1-1000个字符之间")
-        
-        if condition not in ['new', 'like_new', 'used', 'worn']:
-            return error_response("物品状态必须是: new, like_new, used, worn 之一")
-        
-        # 验证分类是否存在
-        category = ItemCategory.query.get(category_id)
-        if not category:
-            return error_response("分类不存在")
-        
-        # 验证图片URL
-        if not image_urls or len(image_urls) == 0:
-            return error_response("至少需要上传一张图片")
-        
-        if len(image_urls) > 10:
-            return error_response("最多只能上传10张图片")
-        
-        # 验证经纬度
-        if latitude is not None and longitude is not None:
-            try:
-                latitude = float(latitude)
-                longitude = float(longitude)
-                if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
-                    return error_response("经纬度范围不正确")
-            except (ValueError, TypeError):
-                return error_response("经纬度格式不正确")
-        else:
-            latitude = longitude = None
-        
         # 创建物品
         item = Item(
             user_id=current_user_id,
-            title=title,
-            description=description,
-            category_id=category_id,
-            condition=condition,
-            latitude=latitude,
-            longitude=longitude
+            title=fields['title'],
+            description=fields['description'],
+            category_id=fields['category_id'],
+            condition=fields['condition'],
+            primary_image_url=fields['image_urls'][0]
         )
+        item.set_location(fields['latitude'], fields['longitude'])
         
         db.session.add(item)
         db.session.flush()  # 获取item_id
         
         # 添加图片
-        for i, image_url in enumerate(image_urls):
+        for i, image_url in enumerate(fields['image_urls']):
             image = ItemImage(
                 item_id=item.item_id,
-                image_url=image_url.strip(),
+                image_url=image_url,
                 is_primary=(i == 0)  # 第一张图片设为主图
             )
             db.session.add(image)
         
         db.session.commit()
+        refresh_item_indexes(item)
+        notify_saved_searches([item])
         
         return success_response(
             data={
@@ -103,37 +356,213 @@ def create_item():
         db.session.rollback()
         return error_response(f"发布物品失败: {str(e)}", 500)
 
+@items_bp.route('/bulk', methods=['POST'])
+def bulk_create_items():
+    """批量发布物品
+
+    逐行校验后，所有通过校验的物品在同一个事务中写入：物品一次 flush，图片一条批量 INSERT。
+    未通过校验的行不会写入，在结果中返回对应的错误信息。
+    """
+    try:
+        current_user_id = get_current_user().user_id
+        data = request.get_json()
+        
+        if not data or not isinstance(data.get('items'), list) or not data['items']:
+            return error_response("物品列表不能为空")
+        
+        rows = data['items']
+        max_items = current_app.config.get('BULK_ITEMS_MAX', 500)
+        if len(rows) > max_items:
+            return error_response(f"单次最多发布{max_items}个物品")
+        
+        # 一次查询取出所有涉及的分类
+        # 分类ID与单条发布按同样的规则转换，格式不正确的行在逐行校验时返回错误
+        category_ids = {parse_category_id(row.get('category_id')) for row in rows if isinstance(row, dict)}
+        category_ids.discard(None)
+        existing_categories = set()
+        if category_ids:
+            existing_categories = {
+                row.category_id for row in db.session.query(ItemCategory.category_id)
+                .filter(ItemCategory.category_id.in_(category_ids)).all()
+            }
+        
+        results = []
+        valid_rows = []  # (结果下标, 字段)
+        for index, row in enumerate(rows):
+            if not isinstance(row, dict):
+                fields, validation_error = None, "物品数据格式不正确"
+            else:
+                try:
+                    fields, validation_error = validate_item_data(row, existing_categories.__contains__)
+                except (AttributeError, TypeError):
+                    fields, validation_error = None, "物品数据格式不正确"
+            
+            if validation_error:
+                results.append({'index': index, 'success': False, 'error': validation_error})
+            else:
+                results.append({'index': index, 'success': True})
+                valid_rows.append((index, fields))
+        
+        items = []
+        for _, fields in valid_rows:
+            item = Item(
+                user_id=current_user_id,
+                title=fields['title'],
+                description=fields['description'],
+                category_id=fields['category_id'],
+                condition=fields['condition'],
+                primary_image_url=fields['image_urls'][0]
+            )
+            item.set_location(fields['latitude'], fields['longitude'])
+            items.append(item)
+        
+        if items:
+            db.session.add_all(items)
+            db.session.flush()  # 获取item_id
+            
+            image_rows = [
+                {'item_id': item.item_id, 'image_url': image_url, 'is_primary': i == 0}
+                for item, (_, fields) in zip(items, valid_rows)
+                for i, image_url in enumerate(fields['image_urls'])
+            ]
+            db.session.execute(insert(ItemImage), image_rows)
+            db.session.commit()
+            
+            for item, (index, _) in zip(items, valid_rows):
+                results[index]['item_id'] = item.item_id
+                refresh_item_indexes(item)
+            notify_saved_searches(items)
+        
+        return success_response(
+            data={
+                'created': len(items),
+                'failed': len(rows) - len(items),
+                'results': results
+            },
+            message="批量发布完成",
+            code=201 if items else 200
+        )
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"批量发布物品失败: {str(e)}", 500)
+
+@items_bp.route('/bulk-status', methods=['PATCH'])
+def bulk_update_item_status():
+    """批量修改物品状态，只修改当前用户有权限的物品，一条 UPDATE 完成"""
+    try:
+        current_user = get_current_user()
+        data = request.get_json()
+        
+        if not data:
+            return error_response("请求数据不能为空")
+        
+        validation_error = validate_required_fields(data, ['item_ids', 'status'])
+        if validation_error:
+            return error_response(validation_error)
+        
+        item_ids = data['item_ids']
+        status = data['status']
+        
+        if not isinstance(item_ids, list) or not all(isinstance(item_id, int) for item_id in item_ids):
+            return error_response("物品ID列表格式不正确")
+        
+        max_items = current_app.config.get('BULK_ITEMS_MAX', 500)
+        if len(item_ids) > max_items:
+            return error_response(f"单次最多修改{max_items}个物品")
+        
+        if status not in ITEM_STATUSES:
+            return error_response("无效的物品状态")
+        
+        # 只有物品所有者或管理员可以修改
+        query = Item.query.filter(Item.item_id.in_(set(item_ids)))
+        if not current_user.is_admin:
+            query = query.filter(Item.user_id == current_user.user_id)
+        
+        rows = query.with_entities(Item.item_id, Item.category_id, Item.status).all()
+        updated_ids = [row.item_id for row in rows]
+        if updated_ids:
+            Item.query.filter(Item.item_id.in_(updated_ids)).update(
+                {Item.status: status}, synchronize_session=False
+            )
+            
+            # 批量 UPDATE 不经过 ORM 对象，分类计数的增量在这里按修改前的状态算出
+            deltas = {}
+            for row in rows:
+                delta = (status == 'available') - (row.status == 'available')
+                deltas[row.category_id] = deltas.get(row.category_id, 0) + delta
+            apply_category_deltas(db.session, deltas)
+            db.session.commit()
+            touch_item_indexes()
+            
+            for item_id in updated_ids:
+                item_cache.delete(item_id)
+        
+        updated = set(updated_ids)
+        return success_response(
+            data={
+                'updated': len(updated_ids),
+                'updated_ids': updated_ids,
+                'skipped_ids': [item_id for item_id in dict.fromkeys(item_ids) if item_id not in updated]
+            },
+            message="批量修改物品状态成功"
+        )
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"批量修改物品状态失败: {str(e)}", 500)
+
 @items_bp.route('/<int:item_id>', methods=['GET'])
 def get_item(item_id):
     """获取物品详情"""
     try:
-        item = Item.query.get(item_id)
-        if not item:
-            return error_response("物品不存在", 404)
-        
         # 获取当前用户（如果已登录）
         current_user = get_current_user()
         
-        item_data = item.to_dict(include_images=True)
+        def load_item():
+            item = Item.query.get(item_id)
+            return serialize_items([item])[0] if item else None
         
-        # 如果当前用户已登录且有位置信息，计算距离
-        if current_user and current_user.latitude and current_user.longitude and item.latitude and item.longitude:
-            distance = calculate_distance(
-                current_user.latitude, current_user.longitude,
-                item.latitude, item.longitude
+        # 物品及其关联数据（分类名称、发布者资料、图片）的版本戳，同时用于 ETag 和校验缓存的载荷
+        stamp = version_stamps.stamp(*item_version_names(item_id))
+        
+        def build_response():
+            # 读缓存，命中且生成时的版本戳没变时不再查询物品、分类、发布者和图片；
+            # 分类改名、发布者修改资料等不经过物品接口的写入会改变版本戳，旧载荷不再使用
+            cached = item_cache.get(item_id)
+            if cached is not None and cached.get('version') == stamp:
+                item_data = cached['data']
+            else:
+                item_data = load_item()
+                if item_data:
+                    item_cache.set(item_id, {'version': stamp, 'data': item_data})
+            if not item_data:
+                return error_response("物品不存在", 404)
+            
+            # 距离与查看者相关，在缓存的载荷之上单独计算
+            if current_user and current_user.latitude and current_user.longitude and item_data['latitude'] and item_data['longitude']:
+                distance = calculate_distance(
+                    current_user.latitude, current_user.longitude,
+                    item_data['latitude'], item_data['longitude']
+                )
+                if distance is not None:
+                    item_data['distance'] = round(distance, 2)
+            
+            return success_response(
+                data=item_data,
+                message="获取物品详情成功"
             )
-            if distance is not None:
-                item_data['distance'] = round(distance, 2)
         
-        return success_response(
-            data=item_data,
-            message="获取物品详情成功"
-        )
+        # 物品及其关联数据的版本号没变时直接返回304
+        viewer_location = (current_user.latitude, current_user.longitude) if current_user else None
+        etag = make_etag(stamp, viewer_location)
+        return etag_response(etag, build_response)
         
     except Exception as e:
         return error_response(f"获取物品详情失败: {str(e)}", 500)
 
 @items_bp.route('', methods=['GET'])
+@versioned('item', 'item_image', 'item_category', 'user', vary=viewer_key)
 def get_items():
     """获取物品列表"""
     try:
@@ -146,49 +575,121 @@ def get_items():
         user_id = request.args.get('user_id', type=int)
         nearby = request.args.get('nearby', type=bool)
         max_distance = request.args.get('max_distance', 10, type=float)  # 默认10公里
-        
-        query = Item.query
-        
-        # 状态筛选
-        if status:
-            query = query.filter(Item.status == status)
-        
-        # 分类筛选
-        if category_id:
-            query = query.filter(Item.category_id == category_id)
-        
-        # 新旧程度筛选
-        if condition:
-            query = query.filter(Item.condition == condition)
-        
-        # 用户筛选
-        if user_id:
-            query = query.filter(Item.user_id == user_id)
-        
-        # 搜索功能
-        if search:
-            query = query.filter(
-                or_(
-                    Item.title.contains(search),
-                    Item.description.contains(search)
-                )
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        # 分面统计：facets=category_id,condition 返回当前筛选条件下各维度取值的物品数量
+        try:
+            facets = parse_facets(request.args.get('facets', ''))
+        except ValueError as e:
+            return error_response(str(e))
+        facet_signature = [category_id, condition, status, user_id, search]
+        
+        # 稀疏字段集：fields=item_id,title,status 只加载和返回指定字段；
+        # include_images=false 时不返回图片数组，只返回冗余的主图URL
+        try:
+            fields = parse_item_fields(request.args)
+        except ValueError as e:
+            return error_response(str(e))
+        serializer = lambda rows: serialize_items(rows, fields=fields)
+        
+        if after is not None:
+            if not is_valid_cursor(after):
+                return error_response("分页游标无效")
+            if nearby or request.args.get('sort_by') == 'distance':
+                return error_response("按距离排序时不支持游标分页")
+            # 游标中只有 (created_at, item_id)，其他排序方式不能据此翻页，不能静默忽略
+            if request.args.get('sort_by', 'created_at') != 'created_at':
+                return error_response("游标分页只支持按 created_at 排序")
+            if request.args.get('sort_order', 'desc') not in ('asc', 'desc'):
+                return error_response("sort_order 只能是 asc 或 desc")
+        
+        query, search_ids = filter_items(Item.query, category_id, condition, status, user_id, search)
+        
+        # 按距离排序：nearby 只取 max_distance 半径内的物品，sort_by=distance 不限距离，两者都只包含有坐标的物品。
+        # 空间索引一次向量化计算出候选物品的距离并排序，有其他筛选条件时再到数据库中过滤，total为准确的命中数
+        current_user = get_current_user()
+        by_distance = nearby or request.args.get('sort_by') == 'distance'
+        if by_distance and current_user and current_user.latitude and current_user.longitude:
+            latitude, longitude = current_user.latitude, current_user.longitude
+            radius = max_distance if nearby else None
+            filtered = any([category_id, condition, status, user_id, search])
+            page, per_page = normalize_pagination(page, per_page)
+            
+            if not current_app.config.get('GEO_INDEX_ENABLED', True):
+                # 未启用空间索引时由数据库按包围盒预筛选，其他筛选条件一并在数据库中套用
+                nearby_items = nearby_from_database(query, latitude, longitude, radius)
+                ranked_ids = [item_id for item_id, _ in nearby_items]
+                total = len(ranked_ids)
+            else:
+                # 没有其他筛选条件、也不需要分面统计时，只需对截至当前页的物品排序
+                limit = None if filtered or facets else page * per_page
+                nearby_items, total = geo_index.nearest(latitude, longitude, radius, limit)
+                
+                if filtered:
+                    matched_ids = set()
+                    if nearby_items:
+                        id_query = query.with_entities(Item.item_id)
+                        if radius is not None:
+                            # 用包围盒代替巨大的 IN 列表，数据库可以走坐标索引
+                            id_query = id_query.filter(within_bounding_box(latitude, longitude, radius))
+                        matched_ids = {row.item_id for row in id_query.all()}
+                    nearby_items = [(item_id, distance) for item_id, distance in nearby_items if item_id in matched_ids]
+                    total = len(nearby_items)
+                ranked_ids = [item_id for item_id, _ in nearby_items]
+            
+            distances = dict(nearby_items)
+            page_ids = ranked_ids[(page - 1) * per_page:page * per_page]
+            extras = {item_id: {'distance': round(distances[item_id], 2)} for item_id in page_ids}
+            result = paginate_ranked(ranked_ids, page, per_page, extras, fields, total)
+            
+            if facets:
+                facet_signature += [current_user.latitude, current_user.longitude, radius]
+                if radius is None:
+                    facet_query = query.filter(Item.latitude.isnot(None), Item.longitude.isnot(None))
+                else:
+                    facet_query = query.filter(Item.item_id.in_(ranked_ids))
+                result['facets'] = get_facets(
+                    facet_query, facets, facet_signature
+                ) if ranked_ids else {name: [] for name in facets}
+            
+            return success_response(
+                data=result,
+                message="获取物品列表成功"
             )
         
-        # 附近物品筛选
-        current_user = get_current_user()
-        if nearby and current_user and current_user.latitude and current_user.longitude:
-            # 这里简化处理， 因为我不会（笑）
-            query = query.filter(
-                and_(
-                    Item.latitude.isnot(None),
-                    Item.longitude.isnot(None)
-                )
+        # 游标分页：按 (created_at, item_id) 排序，默认从新到旧
+        if after is not None:
+            result = paginate_keyset(
+                load_fields(query, Item, ITEM_FIELDS, fields),
+                Item.created_at, Item.item_id, after, per_page,
+                descending=request.args.get('sort_order', 'desc') != 'asc',
+                with_total=with_total, serializer=serializer
+            )
+            if facets:
+                result['facets'] = get_facets(query, facets, facet_signature)
+            
+            return success_response(
+                data=result,
+                message="获取物品列表成功"
             )
         
-        # 排序
-        sort_by = request.args.get('sort_by', 'item_id')
+        # 排序（搜索时默认按相关度排序）
+        sort_by = request.args.get('sort_by', 'relevance' if search_ids is not None else 'item_id')
         sort_order = request.args.get('sort_order', 'asc')
         
+        if sort_by == 'relevance' and search_ids is not None:
+            matched_ids = {row.item_id for row in query.with_entities(Item.item_id).all()}
+            ranked_ids = [item_id for item_id in search_ids if item_id in matched_ids]
+            result = paginate_ranked(ranked_ids, page, per_page, fields=fields)
+            if facets:
+                result['facets'] = get_facets(query, facets, facet_signature)
+            
+            return success_response(
+                data=result,
+                message="获取物品列表成功"
+            )
+        
         if sort_by == 'item_id':
             if sort_order == 'asc':
                 query = query.order_by(Item.item_id.asc())
@@ -205,24 +706,9 @@ def get_items():
             else:
                 query = query.order_by(Item.updated_at.desc())
         
-        result = paginate_query(query, page, per_page)
-        
-        # 如果是附近物品搜索，计算距离并过滤
-        if nearby and current_user and current_user.latitude and current_user.longitude:
-            filtered_items = []
-            for item_data in result['items']:
-                item = Item.query.get(item_data['item_id'])
-                if item.latitude and item.longitude:
-                    distance = calculate_distance(
-                        current_user.latitude, current_user.longitude,
-                        item.latitude, item.longitude
-                    )
-                    if distance is not None and distance <= max_distance:
-                        item_data['distance'] = round(distance, 2)
-                        filtered_items.append(item_data)
-            
-            result['items'] = sorted(filtered_items, key=lambda x: x.get('distance', float('inf')))
-            result['pagination']['total'] = len(filtered_items)
+        result = paginate_query(load_fields(query, Item, ITEM_FIELDS, fields), page, per_page, serializer)
+        if facets:
+            result['facets'] = get_facets(query, facets, facet_signature)
         
         return success_response(
             data=result,
@@ -232,6 +718,107 @@ def get_items():
     except Exception as e:
         return error_response(f"获取物品列表失败: {str(e)}", 500)
 
+# 导出的列，分类名和发布者用户名通过连接查询取得
+EXPORT_COLUMNS = [
+    ('item_id', Item.item_id),
+    ('user_id', Item.user_id),
+    ('owner_username', User.username),
+    ('title', Item.title),
+    ('description', Item.description),
+    ('category_id', Item.category_id),
+    ('category_name', ItemCategory.name),
+    ('primary_image_url', Item.primary_image_url),
+    ('status', Item.status),
+    ('condition', Item.condition),
+    ('latitude', Item.latitude),
+    ('longitude', Item.longitude),
+    ('created_at', Item.created_at),
+    ('updated_at', Item.updated_at),
+]
+
+def export_value(value):
+    """把数据库取值转换为可以写入 JSON/CSV 的值"""
+    if value is None or isinstance(value, (int, str)):
+        return value
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return float(value)
+
+@items_bp.route('/suggest', methods=['GET'])
+def suggest_items():
+    """搜索框输入联想：按前缀匹配物品标题和分类名称，只查询内存中的前缀索引"""
+    try:
+        prefix = request.args.get('q', '').strip()
+        limit = min(max(request.args.get('limit', 10, type=int), 1), 20)
+        
+        return success_response(
+            data=suggest_index.suggest(prefix, limit) if prefix else [],
+            message="获取联想词成功"
+        )
+        
+    except Exception as e:
+        return error_response(f"获取联想词失败: {str(e)}", 500)
+
+@items_bp.route('/export', methods=['GET'])
+def export_items():
+    """流式导出物品（NDJSON 或 CSV）
+
+    筛选参数与物品列表相同。使用服务端游标按批读取，逐行生成响应，
+    内存占用与导出的行数无关。
+    """
+    try:
+        export_format = request.args.get('format', 'ndjson').lower()
+        if export_format not in ('ndjson', 'csv'):
+            return error_response("导出格式必须是: ndjson, csv 之一")
+        
+        names = [name for name, _ in EXPORT_COLUMNS]
+        query = db.session.query(*(column.label(name) for name, column in EXPORT_COLUMNS))\
+            .select_from(Item)\
+            .outerjoin(User, Item.user_id == User.user_id)\
+            .outerjoin(ItemCategory, Item.category_id == ItemCategory.category_id)
+        query, _ = filter_items(
+            query,
+            category_id=request.args.get('category_id', type=int),
+            condition=request.args.get('condition'),
+            status=request.args.get('status'),
+            user_id=request.args.get('user_id', type=int),
+            search=request.args.get('search', '').strip()
+        )
+        query = query.order_by(Item.item_id).yield_per(current_app.config.get('EXPORT_BATCH_SIZE', 1000))
+        
+        def generate_ndjson():
+            for row in query:
+                yield json.dumps(
+                    {name: export_value(value) for name, value in zip(names, row)},
+                    ensure_ascii=False
+                ) + '\n'
+        
+        def generate_csv():
+            buffer = io.StringIO()
+            writer = csv.writer(buffer)
+            # 带 BOM，Excel 打开时才能正确识别 UTF-8 中文
+            writer.writerow(names)
+            yield '\ufeff' + buffer.getvalue()
+            for row in query:
+                buffer.seek(0)
+                buffer.truncate()
+                writer.writerow([export_value(value) for value in row])
+                yield buffer.getvalue()
+        
+        if export_format == 'csv':
+            generate, mimetype = generate_csv, 'text/csv'
+        else:
+            generate, mimetype = generate_ndjson, 'application/x-ndjson'
+        
+        return Response(
+            stream_with_context(generate()),
+            mimetype=mimetype,
+            headers={'Content-Disposition': f'attachment; filename=items.{export_format}'}
+        )
+        
+    except Exception as e:
+        return error_response(f"导出物品失败: {str(e)}", 500)
+
 @items_bp.route('/<int:item_id>', methods=['PUT'])
 def update_item(item_id):
     """更新物品信息"""
@@ -276,7 +863,7 @@ def update_item(item_id):
         
         # 更新状态
         if 'status' in data:
-            if data['status'] not in ['available', 'reserved', 'completed', 'cancelled']:
+            if data['status'] not in ITEM_STATUSES:
                 return error_response("物品状态必须是: available, reserved, completed, cancelled 之一")
             item.status = data['status']
         
@@ -294,11 +881,9 @@ def update_item(item_id):
                     longitude = float(data['longitude'])
                     if not (-90 <= latitude <= 90) or not (-180 <= longitude <= 180):
                         return error_response("经纬度范围不正确")
-                    item.latitude = latitude
-                    item.longitude = longitude
+                    item.set_location(latitude, longitude)
                 else:
-                    item.latitude = None
-                    item.longitude = None
+                    item.set_location(None, None)
             except (ValueError, TypeError):
                 return error_response("经纬度格式不正确")
         
@@ -311,19 +896,10 @@ def update_item(item_id):
             if len(image_urls) > 10:
                 return error_response("最多只能上传10张图片")
             
-            # 删除原有图片
-            ItemImage.query.filter_by(item_id=item_id).delete()
-            
-            # 添加新图片
-            for i, image_url in enumerate(image_urls):
-                image = ItemImage(
-                    item_id=item_id,
-                    image_url=image_url.strip(),
-                    is_primary=(i == 0)
-                )
-                db.session.add(image)
+            sync_item_images(item, [image_url.strip() for image_url in image_urls])
         
         db.session.commit()
+        refresh_item_indexes(item)
         
         return success_response(
             data=item.to_dict(include_images=True),
@@ -363,6 +939,7 @@ def delete_item(item_id):
         
         db.session.delete(item)
         db.session.commit()
+        remove_item_indexes(item_id)
         
         return success_response(
             message="物品删除成功",
@@ -374,6 +951,7 @@ def delete_item(item_id):
         return error_response(f"删除物品失败: {str(e)}", 500)
 
 @items_bp.route('/my', methods=['GET'])
+@versioned('item', 'item_image', 'item_category', 'user', vary=viewer_key)
 def get_my_items():
     """获取当前用户发布的物品"""
     try:
@@ -382,15 +960,31 @@ def get_my_items():
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
         status = request.args.get('status')
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        if after is not None and not is_valid_cursor(after):
+            return error_response("分页游标无效")
+        
+        try:
+            fields = parse_item_fields(request.args)
+        except ValueError as e:
+            return error_response(str(e))
+        serializer = lambda rows: serialize_items(rows, fields=fields)
         
         query = Item.query.filter_by(user_id=current_user_id)
         
         if status:
             query = query.filter(Item.status == status)
         
-        query = query.order_by(Item.created_at.desc())
+        query = load_fields(query, Item, ITEM_FIELDS, fields)
         
-        result = paginate_query(query, page, per_page)
+        if after is not None:
+            result = paginate_keyset(query, Item.created_at, Item.item_id, after, per_page,
+                                     with_total=with_total, serializer=serializer)
+        else:
+            query = query.order_by(Item.created_at.desc())
+            result = paginate_query(query, page, per_page, serializer)
         
         return success_response(
             data=result,
@@ -435,9 +1029,15 @@ def delete_item_image(image_id):
             ).first()
             if next_image:
                 next_image.is_primary = True
+                item.primary_image_url = next_image.image_url
         
+        # 删除主图时会修改物品的主图URL
+        item_changed = db.session.is_modified(item)
         db.session.delete(image)
         db.session.commit()
+        item_cache.delete(item.item_id)
+        if item_changed:
+            touch_item_indexes()
         
         return success_response(
             message="图片删除成功",
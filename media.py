@@ -0,0 +1,72 @@
+import os
+import re
+import mimetypes
+from urllib.parse import quote
+from flask import Blueprint, Response, request, current_app, send_file, abort
+from werkzeug.security import safe_join
+from image_variants import VARIANT_SOURCE_EXTENSIONS, variant_sources
+
+media_bp = Blueprint('media', __name__)
+
+# 上传图片的发送：覆盖 Flask 默认的 /static/uploads 静态文件处理。
+# 内容寻址的文件名（SHA-256 摘要，衍生版本带 _<尺寸> 后缀）内容永远不变，可以让浏览器缓存一年且不再验证；
+# 支持 WebP 的浏览器请求 JPEG/PNG 时直接发送同名的 WebP 版本。
+_CONTENT_ADDRESSED_RE = re.compile(r'^([0-9a-f]{64})(_[a-z]+)?$')
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+
+def _accepts_webp():
+    # 只认显式列出的 image/webp，image/* 和 */* 不代表浏览器能解码 WebP
+    return any(value == 'image/webp' and quality > 0 for value, quality in request.accept_mimetypes)
+
+@media_bp.route('/static/uploads/<path:filename>', methods=['GET'])
+def serve_upload(filename):
+    """发送上传的图片，带长期缓存头、强 ETag 和 Range 支持"""
+    upload_root = current_app.config['UPLOAD_FOLDER']
+    
+    # 以点开头的目录和文件（分片上传的临时文件等）不对外提供
+    if any(part.startswith('.') for part in filename.split('/')):
+        abort(404)
+    path = safe_join(upload_root, filename)
+    if path is None:
+        abort(404)
+    
+    # final 表示发送的就是这个URL最终的内容；衍生版本还没生成时先发送原图，只能短期缓存
+    final = True
+    negotiable = os.path.splitext(path)[1].lower() in VARIANT_SOURCE_EXTENSIONS
+    if negotiable and _accepts_webp():
+        webp_path = f'{os.path.splitext(path)[0]}.webp'
+        if os.path.isfile(webp_path):
+            path = webp_path
+        else:
+            final = False
+    if not os.path.isfile(path):
+        path = next((source for source in variant_sources(path) if os.path.isfile(source)), None)
+        if path is None:
+            abort(404)
+        final = False
+    
+    match = _CONTENT_ADDRESSED_RE.match(os.path.splitext(os.path.basename(path))[0])
+    if not final:
+        cache_control = f"public, max-age={current_app.config.get('UPLOAD_FALLBACK_MAX_AGE', 60)}"
+    elif match:
+        cache_control = f'public, max-age={IMMUTABLE_MAX_AGE}, immutable'
+    else:
+        cache_control = f"public, max-age={current_app.config.get('UPLOAD_CACHE_MAX_AGE', 3600)}"
+    
+    accel_prefix = current_app.config.get('UPLOAD_ACCEL_REDIRECT')
+    if accel_prefix:
+        # 交给 nginx 的 internal location 发送文件，条件请求和 Range 也由 nginx 处理
+        relative = os.path.relpath(path, upload_root).replace(os.sep, '/')
+        response = Response(mimetype=mimetypes.guess_type(path)[0] or 'application/octet-stream')
+        response.headers['X-Accel-Redirect'] = f"{accel_prefix.rstrip('/')}/{quote(relative)}"
+    else:
+        # 原图的摘要本身就是内容的强校验值；衍生版本使用文件大小和修改时间生成的 ETag。
+        # 配置 USE_X_SENDFILE 时 send_file 只返回 X-Sendfile 头，由前端服务器读取文件
+        is_original = match and not match.group(2) and not path.endswith('.webp')
+        etag = match.group(1) if is_original else True
+        response = send_file(path, conditional=True, etag=etag)
+    
+    response.headers['Cache-Control'] = cache_control
+    if negotiable:
+        response.vary.add('Accept')
+    return response
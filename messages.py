@@ -1,12 +1,31 @@
 from flask import Blueprint, request, jsonify
 from flask_jwt_extended import jwt_required, get_jwt_identity
 from models import Message, User, db
-from utils import success_response, error_response, validate_required_fields, paginate_query
+from serializers import preload_messages
+from utils import success_response, error_response, validate_required_fields, paginate_query, paginate_keyset, is_valid_cursor
 from datetime import datetime
 from sqlalchemy import and_, or_, func
 
 messages_bp = Blueprint('messages', __name__, url_prefix='/api/v1/messages')
 
+def serialize_message_list(messages):
+    """转换消息列表数据，添加发送者信息"""
+    # 一次性预加载发送者和接收者，避免逐行查询
+    preload_messages(messages)
+    
+    messages_data = []
+    for message in messages:
+        message_data = message.to_dict()
+        if message.sender:
+            message_data['sender'] = {
+                'user_id': message.sender.user_id,
+                'username': message.sender.username
+            }
+        else:
+            message_data['sender'] = None  # 系统消息
+        messages_data.append(message_data)
+    return messages_data
+
 @messages_bp.route('', methods=['POST'])
 def send_message():
     """发送消息"""
@@ -82,6 +101,11 @@ def get_messages():
         message_type = request.args.get('type')
         is_read = request.args.get('is_read')
         conversation_with = request.args.get('conversation_with', type=int)
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        if after is not None and not is_valid_cursor(after):
+            return error_response("分页游标无效")
         
         # 管理员可以查看所有消息，不限制recipient_id
         query = Message.query
@@ -99,21 +123,14 @@ def get_messages():
         if conversation_with:
             query = query.filter(Message.sender_id == conversation_with)
         
-        query = query.order_by(Message.created_at.asc())
-        
-        result = paginate_query(query, page, per_page)
-        
-        # 为每条消息添加发送者信息
-        for message_data in result['items']:
-            message = Message.query.get(message_data['message_id'])
-            if message.sender_id:
-                sender = User.query.get(message.sender_id)
-                message_data['sender'] = {
-                    'user_id': sender.user_id,
-                    'username': sender.username
-                }
-            else:
-                message_data['sender'] = None  # 系统消息
+        if after is not None:
+            result = paginate_keyset(
+                query, Message.created_at, Message.message_id, after, per_page,
+                descending=False, with_total=with_total, serializer=serialize_message_list
+            )
+        else:
+            query = query.order_by(Message.created_at.asc())
+            result = paginate_query(query, page, per_page, serializer=serialize_message_list)
         
         return success_response(
             data=result,
@@ -271,25 +288,34 @@ def get_conversations():
         total = conversations_query.count()
         conversations = conversations_query.offset((page - 1) * per_page).limit(per_page).all()
         
+        # 一次性预加载对话双方，并按发送者分组统计未读消息数
+        preload_messages(conversations)
+        other_user_ids = {
+            message.sender_id if message.recipient_id == current_user_id else message.recipient_id
+            for message in conversations
+        }
+        other_user_ids.discard(None)
+        unread_counts = {}
+        if other_user_ids:
+            unread_counts = dict(db.session.query(Message.sender_id, func.count(Message.message_id)).filter(
+                and_(
+                    Message.recipient_id == current_user_id,
+                    Message.sender_id.in_(other_user_ids),
+                    Message.is_read == False
+                )
+            ).group_by(Message.sender_id).all())
+        
         conversations_data = []
         for message in conversations:
             # 确定对话对象
             if message.recipient_id == current_user_id:
-                other_user_id = message.sender_id
+                other_user = message.sender
             else:
-                other_user_id = message.recipient_id
+                other_user = message.recipient
             
-            if other_user_id:  # 排除系统消息
-                other_user = User.query.get(other_user_id)
-                
-                # 计算未读消息数
-                unread_count = Message.query.filter(
-                    and_(
-                        Message.recipient_id == current_user_id,
-                        Message.sender_id == other_user_id,
-                        Message.is_read == False
-                    )
-                ).count()
+            if other_user:  # 排除系统消息
+                # 未读消息数
+                unread_count = unread_counts.get(other_user.user_id, 0)
                 
                 conversation_data = {
                     'user': {
@@ -325,6 +351,11 @@ def get_conversation_messages(user_id):
         current_user_id = 1
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 50, type=int)
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        if after is not None and not is_valid_cursor(after):
+            return error_response("分页游标无效")
         
         # 验证用户是否存在
         other_user = User.query.get(user_id)
@@ -337,9 +368,13 @@ def get_conversation_messages(user_id):
                 and_(Message.sender_id == current_user_id, Message.recipient_id == user_id),
                 and_(Message.sender_id == user_id, Message.recipient_id == current_user_id)
             )
-        ).order_by(Message.created_at.desc())
+        )
         
-        result = paginate_query(query, page, per_page)
+        if after is not None:
+            result = paginate_keyset(query, Message.created_at, Message.message_id, after, per_page, with_total=with_total)
+        else:
+            query = query.order_by(Message.created_at.desc())
+            result = paginate_query(query, page, per_page)
         
         # 标记来自对方的未读消息为已读
         unread_messages = Message.query.filter(
@@ -2,9 +2,15 @@ from flask_sqlalchemy import SQLAlchemy
 from werkzeug.security import generate_password_hash, check_password_hash
 from datetime import datetime
 from enum import Enum
+from geo_index import encode_geohash
+from image_variants import variant_urls
 
 db = SQLAlchemy()
 
+def pick_fields(builders, fields=None):
+    """按字段名调用对应的取值函数生成字典，fields 为 None 时返回全部字段"""
+    return {name: build() for name, build in builders.items() if fields is None or name in fields}
+
 class User(db.Model):
     __tablename__ = 'user'
     
@@ -18,7 +24,7 @@ class User(db.Model):
     longitude = db.Column(db.Numeric(9, 6), comment='用户注册地址的经度')
     reputation_score = db.Column(db.Float, default=5.0, comment='信誉评分，范围1.0-5.0')
     is_admin = db.Column(db.Boolean, default=False, comment='是否为管理员')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='用户注册时间')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='用户注册时间')
     
     # 关系
     items = db.relationship('Item', backref='owner', lazy='dynamic', cascade='all, delete-orphan')
@@ -27,6 +33,7 @@ class User(db.Model):
     reviews_received = db.relationship('Review', foreign_keys='Review.reviewee_id', backref='reviewee', lazy='dynamic')
     messages_received = db.relationship('Message', foreign_keys='Message.recipient_id', backref='recipient', lazy='dynamic')
     messages_sent = db.relationship('Message', foreign_keys='Message.sender_id', backref='sender', lazy='dynamic')
+    saved_searches = db.relationship('SavedSearch', backref='user', lazy='dynamic', cascade='all, delete-orphan')
     
     def set_password(self, password):
         """设置密码哈希"""
@@ -36,20 +43,20 @@ class User(db.Model):
         """验证密码"""
         return check_password_hash(self.password_hash, password)
     
-    def to_dict(self, include_sensitive=False):
-        """转换为字典"""
-        data = {
-            'user_id': self.user_id,
-            'username': self.username,
-            'email': self.email if include_sensitive else None,
-            'phone': self.phone if include_sensitive else None,
-            'address': self.address if include_sensitive else None,
-            'latitude': float(self.latitude) if self.latitude else None,
-            'longitude': float(self.longitude) if self.longitude else None,
-            'reputation_score': self.reputation_score,
-            'is_admin': self.is_admin if include_sensitive else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None
-        }
+    def to_dict(self, include_sensitive=False, fields=None):
+        """转换为字典，fields 为需要返回的字段集合（None 表示全部）"""
+        data = pick_fields({
+            'user_id': lambda: self.user_id,
+            'username': lambda: self.username,
+            'email': lambda: self.email if include_sensitive else None,
+            'phone': lambda: self.phone if include_sensitive else None,
+            'address': lambda: self.address if include_sensitive else None,
+            'latitude': lambda: float(self.latitude) if self.latitude else None,
+            'longitude': lambda: float(self.longitude) if self.longitude else None,
+            'reputation_score': lambda: self.reputation_score,
+            'is_admin': lambda: self.is_admin if include_sensitive else None,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None
+        }, fields)
         return {k: v for k, v in data.items() if v is not None}
 
 class ItemCategory(db.Model):
@@ -64,16 +71,11 @@ class ItemCategory(db.Model):
     items = db.relationship('Item', backref='category', lazy='dynamic')
     
     def get_total_item_count(self):
-        """递归获取当前分类及其所有子分类的物品总数"""
-        # 当前分类的物品数量
-        current_count = self.items.filter_by(status='available').count()
-        
-        # 递归获取所有子分类的物品数量
-        children_count = 0
-        for child in self.children:
-            children_count += child.get_total_item_count()
-        
-        return current_count + children_count
+        """获取当前分类及其所有子分类的可用物品总数，通过分类闭包表一次查询"""
+        return db.session.query(db.func.count(Item.item_id))\
+            .join(ItemCategoryClosure, Item.category_id == ItemCategoryClosure.descendant_id)\
+            .filter(ItemCategoryClosure.ancestor_id == self.category_id, Item.status == 'available')\
+            .scalar()
     
     def to_dict(self, include_children=False):
         """转换为字典"""
@@ -86,46 +88,96 @@ class ItemCategory(db.Model):
             data['children'] = [child.to_dict() for child in self.children]
         return data
 
+class ItemCategoryClosure(db.Model):
+    """分类闭包表：每个分类与它自己以及每一个祖先分类各有一行，depth 为相隔的层数
+
+    子树查询不再需要递归，统计子树物品数只需一条按祖先分组的查询。
+    由分类的增删改接口通过 category_closure 模块维护。
+    """
+    __tablename__ = 'item_category_closure'
+    
+    ancestor_id = db.Column(db.Integer, db.ForeignKey('item_category.category_id', ondelete='CASCADE'), primary_key=True, comment='祖先分类ID')
+    descendant_id = db.Column(db.Integer, db.ForeignKey('item_category.category_id', ondelete='CASCADE'), primary_key=True, index=True, comment='后代分类ID')
+    depth = db.Column(db.Integer, nullable=False, comment='祖先到后代相隔的层数，自身为0')
+
+class CategoryStat(db.Model):
+    """分类物品计数：每个分类自身（不含子分类）的可用物品数
+
+    物品写入时由 category_stats 模块按增量在同一事务中维护，子树总数在分类树快照上汇总。
+    """
+    __tablename__ = 'category_stat'
+    
+    category_id = db.Column(db.Integer, db.ForeignKey('item_category.category_id', ondelete='CASCADE'), primary_key=True, comment='分类ID')
+    available_count = db.Column(db.Integer, nullable=False, default=0, comment='可用物品数')
+
 class Item(db.Model):
     __tablename__ = 'item'
+    __table_args__ = (
+        # 附近物品的包围盒预筛选：纬度范围扫描 + 索引内的经度过滤
+        db.Index('ix_item_lat_lng', 'latitude', 'longitude'),
+    )
     
     item_id = db.Column(db.Integer, primary_key=True, comment='物品ID')
     user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False, comment='发布者ID')
     title = db.Column(db.String(100), nullable=False, comment='物品标题')
     description = db.Column(db.Text, nullable=False, comment='物品详细描述')
-    category_id = db.Column(db.Integer, db.ForeignKey('item_category.category_id'), nullable=False, comment='分类ID')
-    status = db.Column(db.Enum('available', 'reserved', 'completed', 'cancelled', 'removed', name='item_status'), 
-                      nullable=False, default='available', comment='物品状态')
+    # 分类和状态修改时需要知道原值来维护分类物品计数（category_stats），active_history 保证赋值前先加载原值
+    category_id = db.column_property(
+        db.Column(db.Integer, db.ForeignKey('item_category.category_id'), nullable=False, comment='分类ID'),
+        active_history=True
+    )
+    status = db.column_property(
+        db.Column(db.Enum('available', 'reserved', 'completed', 'cancelled', 'removed', name='item_status'), 
+                  nullable=False, default='available', comment='物品状态'),
+        active_history=True
+    )
     condition = db.Column(db.Enum('new', 'like_new', 'used', 'worn', name='item_condition'), 
                          nullable=False, comment='新旧程度')
     latitude = db.Column(db.Numeric(9, 6), comment='物品发布地点的纬度')
     longitude = db.Column(db.Numeric(9, 6), comment='物品发布地点的经度')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='物品发布时间')
+    geohash = db.Column(db.String(12), index=True, comment='物品发布地点的geohash编码，用于附近物品检索')
+    primary_image_url = db.Column(db.String(255), comment='主图URL，冗余自item_image，列表页无需再查询图片表')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='物品发布时间')
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment='物品信息最后更新时间')
     
     # 关系
     images = db.relationship('ItemImage', backref='item', lazy='dynamic', cascade='all, delete-orphan')
     requests = db.relationship('Request', backref='item', lazy='dynamic', cascade='all, delete-orphan')
     
-    def to_dict(self, include_images=True):
-        """转换为字典"""
-        data = {
-            'item_id': self.item_id,
-            'user_id': self.user_id,
-            'title': self.title,
-            'description': self.description,
-            'category_id': self.category_id,
-            'category_name': self.category.name if self.category else None,
-            'status': self.status,
-            'condition': self.condition,
-            'latitude': float(self.latitude) if self.latitude else None,
-            'longitude': float(self.longitude) if self.longitude else None,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None,
-            'owner_username': self.owner.username if self.owner else None
-        }
-        if include_images:
-            data['images'] = [img.to_dict() for img in self.images]
+    def set_location(self, latitude, longitude):
+        """设置经纬度并同步geohash"""
+        if latitude is not None and longitude is not None:
+            self.latitude = latitude
+            self.longitude = longitude
+            self.geohash = encode_geohash(latitude, longitude)
+        else:
+            self.latitude = None
+            self.longitude = None
+            self.geohash = None
+    
+    def to_dict(self, include_images=True, images=None, fields=None):
+        """转换为字典，images 为批量预加载的图片列表，fields 为需要返回的字段集合（None 表示全部）"""
+        data = pick_fields({
+            'item_id': lambda: self.item_id,
+            'user_id': lambda: self.user_id,
+            'title': lambda: self.title,
+            'description': lambda: self.description,
+            'category_id': lambda: self.category_id,
+            'category_name': lambda: self.category.name if self.category else None,
+            'status': lambda: self.status,
+            'condition': lambda: self.condition,
+            'latitude': lambda: float(self.latitude) if self.latitude else None,
+            'longitude': lambda: float(self.longitude) if self.longitude else None,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None,
+            'owner_username': lambda: self.owner.username if self.owner else None,
+            'primary_image_url': lambda: self.primary_image_url,
+            'primary_thumbnail_url': lambda: variant_urls(self.primary_image_url).get('thumb', self.primary_image_url)
+        }, fields)
+        if include_images and (fields is None or 'images' in fields):
+            if images is None:
+                images = self.images
+            data['images'] = [img.to_dict() for img in images]
         return data
 
 class ItemImage(db.Model):
@@ -133,7 +185,7 @@ class ItemImage(db.Model):
     
     image_id = db.Column(db.Integer, primary_key=True, comment='图片ID')
     item_id = db.Column(db.Integer, db.ForeignKey('item.item_id'), nullable=False, comment='所属物品ID')
-    image_url = db.Column(db.String(255), nullable=False, comment='图片存储路径')
+    image_url = db.Column(db.String(255), nullable=False, index=True, comment='图片存储路径，按此统计上传文件的引用次数')
     is_primary = db.Column(db.Boolean, default=False, comment='是否为主图')
     created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='图片上传时间')
     
@@ -143,6 +195,7 @@ class ItemImage(db.Model):
             'image_id': self.image_id,
             'item_id': self.item_id,
             'image_url': self.image_url,
+            'variants': variant_urls(self.image_url),
             'is_primary': self.is_primary,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
@@ -156,26 +209,26 @@ class Request(db.Model):
     message = db.Column(db.String(200), comment='附言')
     status = db.Column(db.Enum('pending', 'accepted', 'rejected', 'cancelled', 'completed', name='request_status'), 
                       nullable=False, default='pending', comment='请求状态')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='请求时间')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='请求时间')
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, comment='请求状态最后更新时间')
     
     # 关系
     review = db.relationship('Review', backref='request', uselist=False, cascade='all, delete-orphan')
     
-    def to_dict(self):
-        """转换为字典"""
-        return {
-            'id': self.request_id,
-            'request_id': self.request_id,
-            'item_id': self.item_id,
-            'item_title': self.item.title if self.item else None,
-            'requester_id': self.requester_id,
-            'requester_username': self.requester.username if self.requester else None,
-            'message': self.message,
-            'status': self.status,
-            'created_at': self.created_at.isoformat() if self.created_at else None,
-            'updated_at': self.updated_at.isoformat() if self.updated_at else None
-        }
+    def to_dict(self, fields=None):
+        """转换为字典，fields 为需要返回的字段集合（None 表示全部）"""
+        return pick_fields({
+            'id': lambda: self.request_id,
+            'request_id': lambda: self.request_id,
+            'item_id': lambda: self.item_id,
+            'item_title': lambda: self.item.title if self.item else None,
+            'requester_id': lambda: self.requester_id,
+            'requester_username': lambda: self.requester.username if self.requester else None,
+            'message': lambda: self.message,
+            'status': lambda: self.status,
+            'created_at': lambda: self.created_at.isoformat() if self.created_at else None,
+            'updated_at': lambda: self.updated_at.isoformat() if self.updated_at else None
+        }, fields)
 
 class Review(db.Model):
     __tablename__ = 'review'
@@ -186,7 +239,7 @@ class Review(db.Model):
     reviewee_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False, comment='被评价人ID')
     rating = db.Column(db.SmallInteger, nullable=False, comment='评分（1-5分）')
     comment = db.Column(db.String(200), comment='文字评价')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='评价时间')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='评价时间')
     
     def to_dict(self):
         """转换为字典"""
@@ -214,7 +267,7 @@ class Message(db.Model):
     related_id = db.Column(db.Integer, comment='关联的业务ID')
     content = db.Column(db.Text, nullable=False, comment='消息内容')
     is_read = db.Column(db.Boolean, default=False, comment='是否已读')
-    created_at = db.Column(db.DateTime, default=datetime.utcnow, comment='消息创建时间')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='消息创建时间')
     
     def to_dict(self):
         """转换为字典"""
@@ -229,4 +282,27 @@ class Message(db.Model):
             'content': self.content,
             'is_read': self.is_read,
             'created_at': self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+        }
+
+class SavedSearch(db.Model):
+    __tablename__ = 'saved_search'
+    
+    saved_search_id = db.Column(db.Integer, primary_key=True, comment='保存的搜索ID')
+    user_id = db.Column(db.Integer, db.ForeignKey('user.user_id'), nullable=False, index=True, comment='所属用户ID')
+    name = db.Column(db.String(50), nullable=False, comment='搜索名称')
+    keyword = db.Column(db.String(100), comment='关键词，与物品列表的 search 参数相同')
+    category_id = db.Column(db.Integer, db.ForeignKey('item_category.category_id', ondelete='CASCADE'), comment='分类ID')
+    condition = db.Column(db.Enum('new', 'like_new', 'used', 'worn', name='item_condition'), comment='新旧程度')
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, index=True, comment='创建时间')
+    
+    def to_dict(self):
+        """转换为字典"""
+        return {
+            'saved_search_id': self.saved_search_id,
+            'user_id': self.user_id,
+            'name': self.name,
+            'keyword': self.keyword,
+            'category_id': self.category_id,
+            'condition': self.condition,
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
@@ -0,0 +1,52 @@
+import click
+from sqlalchemy import select, update
+from models import Item, ItemImage, db
+
+# 物品冗余主图URL的回填：primary_image_url 列加入之前发布的物品该列为空，
+# 列表页序列化时每遇到这样的物品都要再查一次图片表。回填后只有没有任何图片的物品仍为空。
+
+
+def backfill_primary_images(batch_size=1000):
+    """为 primary_image_url 为空的物品写入主图URL（没有主图时取最早的图片），返回回填的物品数
+
+    按物品ID分批更新并逐批提交，避免长时间锁住整张物品表。
+    """
+    primary_url = select(ItemImage.image_url)\
+        .where(ItemImage.item_id == Item.item_id)\
+        .order_by(ItemImage.is_primary.desc(), ItemImage.image_id)\
+        .limit(1).scalar_subquery()
+
+    filled = 0
+    last_id = 0
+    while True:
+        item_ids = [row.item_id for row in db.session.query(Item.item_id).filter(
+            Item.primary_image_url.is_(None),
+            Item.item_id > last_id
+        ).order_by(Item.item_id).limit(batch_size).all()]
+        if not item_ids:
+            break
+        last_id = item_ids[-1]
+
+        db.session.execute(
+            update(Item)
+            .where(Item.item_id.in_(item_ids))
+            .values(primary_image_url=primary_url)
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        filled += db.session.query(Item.item_id).filter(
+            Item.item_id.in_(item_ids),
+            Item.primary_image_url.isnot(None)
+        ).count()
+    return filled
+
+
+def init_primary_images(app):
+    """注册 flask backfill-primary-images 命令，加入 primary_image_url 列后执行一次以回填已有物品"""
+
+    @app.cli.command('backfill-primary-images')
+    @click.option('--batch-size', type=int, default=1000, help='每批更新的物品数')
+    def backfill_primary_images_command(batch_size):
+        """为旧物品回填冗余的主图URL"""
+        count = backfill_primary_images(batch_size)
+        click.echo(f"主图URL已回填，共 {count} 个物品")
@@ -1,11 +1,36 @@
 from flask import Blueprint, request, jsonify
 from models import Request, Item, User, Message, db
-from utils import success_response, error_response, validate_required_fields, paginate_query
+from serializers import preload_requests, REQUEST_FIELDS, parse_fields, load_fields
+from cache import item_cache
+from items import touch_item_indexes
+from utils import success_response, error_response, validate_required_fields, paginate_query, paginate_keyset, is_valid_cursor
 from datetime import datetime
 from sqlalchemy import and_, or_
 
 requests_bp = Blueprint('requests', __name__, url_prefix='/api/v1/requests')
 
+def serialize_request_list(requests, fields=None):
+    """转换请求列表数据，添加物品所有者信息，fields 为需要返回的字段集合（None 表示全部）"""
+    # 一次性预加载物品、请求者和物品所有者，避免逐行查询
+    preload_requests(requests, include_owner=True, fields=fields)
+    
+    requests_data = []
+    for req in requests:
+        try:
+            req_dict = req.to_dict(fields=fields)
+            # 安全地添加物品所有者用户名
+            if fields is None or 'owner_username' in fields:
+                try:
+                    req_dict['owner_username'] = req.item.owner.username if req.item and req.item.owner else None
+                except Exception:
+                    req_dict['owner_username'] = None
+            requests_data.append(req_dict)
+        except Exception as e:
+            # 如果单个请求数据转换失败，跳过该请求
+            print(f"转换请求数据失败 (request_id: {req.request_id}): {str(e)}")
+            continue
+    return requests_data
+
 def create_notification_message(recipient_id, sender_id, message_type, related_id, content):
     """创建通知消息"""
     message = Message(
@@ -140,6 +165,17 @@ def get_requests():
         per_page = request.args.get('per_page', 20, type=int)
         status = request.args.get('status')
         request_type = request.args.get('type')  # 'sent' 或 'received'
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        if after is not None and not is_valid_cursor(after):
+            return error_response("分页游标无效")
+        
+        # 稀疏字段集：fields=request_id,status 只返回指定字段
+        try:
+            fields = parse_fields(request.args.get('fields'), REQUEST_FIELDS, 'request_id')
+        except ValueError as e:
+            return error_response(str(e))
         
         # 手动分页处理，避免使用可能有问题的paginate方法
         try:
@@ -162,6 +198,24 @@ def get_requests():
             if status:
                 query = query.filter(Request.status == status)
             
+            query = load_fields(query, Request, REQUEST_FIELDS, fields)
+            
+            # 游标分页：按 (created_at, request_id) 从新到旧
+            if after is not None:
+                result = paginate_keyset(
+                    query, Request.created_at, Request.request_id, after, per_page,
+                    with_total=with_total,
+                    serializer=lambda rows: serialize_request_list(rows, fields)
+                )
+                
+                return success_response(
+                    data={
+                        'requests': result['items'],
+                        'pagination': result['pagination']
+                    },
+                    message="获取请求列表成功"
+                )
+            
             query = query.order_by(Request.created_at.desc())
             
             # 手动分页
@@ -169,20 +223,7 @@ def get_requests():
             requests = query.offset((page - 1) * per_page).limit(per_page).all()
             
             # 转换数据格式，添加物品所有者信息
-            requests_data = []
-            for req in requests:
-                try:
-                    req_dict = req.to_dict()
-                    # 安全地添加物品所有者用户名
-                    try:
-                        req_dict['owner_username'] = req.item.owner.username if req.item and req.item.owner else None
-                    except Exception:
-                        req_dict['owner_username'] = None
-                    requests_data.append(req_dict)
-                except Exception as e:
-                    # 如果单个请求数据转换失败，跳过该请求
-                    print(f"转换请求数据失败 (request_id: {req.request_id}): {str(e)}")
-                    continue
+            requests_data = serialize_request_list(requests, fields)
             
             # 计算分页信息
             pages = (total + per_page - 1) // per_page
@@ -249,6 +290,7 @@ def update_request_status(request_id):
         # 更新请求状态
         req.status = new_status
         req.updated_at = datetime.utcnow()
+        item_status = req.item.status
         
         # 根据状态更新物品状态
         if new_status == 'accepted':
@@ -291,8 +333,14 @@ def update_request_status(request_id):
             content=notification_content
         )
         
+        item_changed = req.item.status != item_status
         db.session.commit()
         
+        # 物品状态有变化时使物品详情缓存失效
+        if item_changed:
+            item_cache.delete(req.item_id)
+            touch_item_indexes()
+        
         return success_response(
             data=req.to_dict(),
             message="请求状态更新成功"
@@ -343,6 +391,8 @@ def complete_request(request_id):
         )
         
         db.session.commit()
+        item_cache.delete(req.item_id)
+        touch_item_indexes()
         
         return success_response(
             data=req.to_dict(),
@@ -493,6 +543,7 @@ def admin_update_request(request_id):
         if 'message' in data:
             req.message = data['message']
         
+        item_status = req.item.status if req.item else None
         if 'status' in data:
             old_status = req.status
             new_status = data['status']
@@ -588,8 +639,14 @@ def admin_update_request(request_id):
                             content=f"您与 {requester.username} 的物品 \"{req.item.title}\" 交易已完成"
                         )
         
+        item_changed = req.item is not None and req.item.status != item_status
         db.session.commit()
         
+        # 任何一个分支改变了物品状态，都使物品详情缓存失效
+        if item_changed:
+            item_cache.delete(req.item_id)
+            touch_item_indexes()
+        
         return success_response(
             data=req.to_dict(),
             message="交易请求更新成功"
@@ -1,6 +1,7 @@
 from flask import Blueprint, request, jsonify
 from models import Review, Request, User, Message, db
-from utils import success_response, error_response, validate_required_fields, paginate_query, update_user_reputation
+from serializers import preload_reviews, serialize_reviews
+from utils import success_response, error_response, validate_required_fields, paginate_query, paginate_keyset, is_valid_cursor, update_user_reputation
 from datetime import datetime
 from sqlalchemy import func, or_
 
@@ -142,6 +143,11 @@ def get_reviews():
         user_id = request.args.get('user_id', type=int)
         rating = request.args.get('rating', type=int)
         review_type = request.args.get('type')  # 'given' 或 'received'
+        after = request.args.get('after')  # 游标分页
+        with_total = request.args.get('with_total', 'false').lower() == 'true'
+        
+        if after is not None and not is_valid_cursor(after):
+            return error_response("分页游标无效")
         
         # 使用固定的管理员用户ID
         current_user_id = 1
@@ -167,9 +173,11 @@ def get_reviews():
         if rating and 1 <= rating <= 5:
             query = query.filter(Review.rating == rating)
         
-        query = query.order_by(Review.created_at.desc())
-        
-        result = paginate_query(query, page, per_page)
+        if after is not None:
+            result = paginate_keyset(query, Review.created_at, Review.review_id, after, per_page, with_total=with_total)
+        else:
+            query = query.order_by(Review.created_at.desc())
+            result = paginate_query(query, page, per_page)
         
         return success_response(
             data={
@@ -218,7 +226,7 @@ def get_user_review_statistics(user_id):
             .limit(5)\
             .all()
         
-        recent_reviews_data = [review.to_dict() for review in recent_reviews]
+        recent_reviews_data = serialize_reviews(recent_reviews)
         
         return success_response(
             data={
@@ -257,13 +265,14 @@ def get_request_reviews(request_id):
         
         # 获取该请求的所有评价
         reviews = Review.query.filter_by(request_id=request_id).all()
+        preload_reviews(reviews)
         
         reviews_data = []
         for review in reviews:
             review_data = review.to_dict()
             # 添加评价者和被评价者信息
-            reviewer = User.query.get(review.reviewer_id)
-            reviewed_user = User.query.get(review.reviewee_id)
+            reviewer = review.reviewer
+            reviewed_user = review.reviewee
             
             review_data['reviewer'] = {
                 'user_id': reviewer.user_id,
@@ -0,0 +1,149 @@
+import threading
+from sqlalchemy import select
+from search_index import tokenize, tokenize_query, is_prefix_token
+from versions import VersionTracker
+
+
+def _token_matches(token, item_tokens):
+    """查询词元是否命中物品：英文单词是物品某个单词的前缀即可，其他词元需要完全相同"""
+    if token in item_tokens:
+        return True
+    return is_prefix_token(token) and any(item_token.startswith(token) for item_token in item_tokens)
+
+
+class SavedSearchIndex:
+    """保存的搜索的反向索引，新物品发布时找出可能匹配的搜索
+
+    带关键词的搜索登记在其中一个查询词元下，只有关键词的搜索登记在分类下。
+    新物品只需按自己的词元（英文单词还包括它的各个前缀，与列表搜索的前缀匹配一致）
+    和分类取出候选搜索，再逐个校验全部条件，
+    不必遍历所有保存的搜索，也不必在数据库中重新执行列表查询。
+    索引在首次使用时从数据库加载，之后由保存的搜索接口增量维护；
+    保存的搜索表的版本号变化（其他进程提交了写入）时重新加载。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._tracker = VersionTracker('saved_search')
+        self._searches = {}  # saved_search_id -> (user_id, name, tokens, category_id, condition)
+        self._by_token = {}  # token -> set(saved_search_id)
+        self._by_category = {}  # category_id -> set(saved_search_id)
+
+    def ensure_loaded(self):
+        """首次使用或保存的搜索表的版本号变化时，从数据库加载所有保存的搜索"""
+        if self._loaded and self._tracker.is_current():
+            return
+        with self._lock:
+            # 先读版本号再加载数据：加载期间有新的提交时，记下的是旧版本号，下次使用时会再次加载。
+            # 数据在新的连接上读取：请求的会话可能早已开启事务，MySQL 可重复读隔离级别下
+            # 读到的是版本号之前的快照，记下新版本号后索引会一直停留在旧数据上
+            version = self._tracker.current()
+            if self._loaded and self._tracker.seen == version:
+                return
+            self._clear()
+            from models import SavedSearch, db
+            with db.engine.connect() as connection:
+                rows = connection.execution_options(yield_per=1000).execute(select(
+                    SavedSearch.saved_search_id, SavedSearch.user_id, SavedSearch.name,
+                    SavedSearch.keyword, SavedSearch.category_id, SavedSearch.condition
+                ))
+                for row in rows:
+                    self._add(*row)
+            self._tracker.mark(version)
+            self._loaded = True
+
+    def reset(self):
+        """清空索引，下次使用时重新加载"""
+        with self._lock:
+            self._clear()
+            self._tracker.reset()
+            self._loaded = False
+
+    def _clear(self):
+        self._searches.clear()
+        self._by_token.clear()
+        self._by_category.clear()
+
+    def upsert(self, saved_search):
+        """新增或更新保存的搜索"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(saved_search.saved_search_id)
+            self._add(
+                saved_search.saved_search_id, saved_search.user_id, saved_search.name,
+                saved_search.keyword, saved_search.category_id, saved_search.condition
+            )
+            self._tracker.advance()
+
+    def remove(self, saved_search_id):
+        """从索引中移除保存的搜索"""
+        with self._lock:
+            if self._loaded:
+                self._remove(saved_search_id)
+                self._tracker.advance()
+
+    def remove_user(self, user_id):
+        """移除用户的全部保存的搜索（用户被删除时调用）"""
+        with self._lock:
+            if not self._loaded:
+                return
+            for saved_search_id in [key for key, value in self._searches.items() if value[0] == user_id]:
+                self._remove(saved_search_id)
+            self._tracker.advance()
+
+    def match(self, item):
+        """返回与物品匹配的保存的搜索 [(saved_search_id, user_id, name)]，不包括物品发布者自己的"""
+        self.ensure_loaded()
+        item_tokens = set(tokenize(item.title)) | set(tokenize(item.description))
+
+        with self._lock:
+            candidates = set(self._by_category.get(item.category_id, ()))
+            for token in item_tokens:
+                keys = (token[:end] for end in range(1, len(token) + 1)) if is_prefix_token(token) else (token,)
+                for key in keys:
+                    candidates.update(self._by_token.get(key, ()))
+
+            matches = []
+            for saved_search_id in candidates:
+                user_id, name, tokens, category_id, condition = self._searches[saved_search_id]
+                if user_id == item.user_id:
+                    continue
+                if category_id is not None and category_id != item.category_id:
+                    continue
+                if condition is not None and condition != item.condition:
+                    continue
+                if not all(_token_matches(token, item_tokens) for token in tokens):
+                    continue
+                matches.append((saved_search_id, user_id, name))
+        return matches
+
+    def _add(self, saved_search_id, user_id, name, keyword, category_id, condition):
+        tokens = tuple(tokenize_query(keyword)) if keyword else ()
+        self._searches[saved_search_id] = (user_id, name, tokens, category_id, condition)
+        if tokens:
+            # 登记在最长的词元下：越长的词元越少见，候选越少
+            anchor = max(tokens, key=len)
+            self._by_token.setdefault(anchor, set()).add(saved_search_id)
+        elif category_id is not None:
+            self._by_category.setdefault(category_id, set()).add(saved_search_id)
+
+    def _remove(self, saved_search_id):
+        entry = self._searches.pop(saved_search_id, None)
+        if entry is None:
+            return
+        _, _, tokens, category_id, _ = entry
+        if tokens:
+            bucket, key = self._by_token, max(tokens, key=len)
+        else:
+            bucket, key = self._by_category, category_id
+        ids = bucket.get(key)
+        if ids is not None:
+            ids.discard(saved_search_id)
+            if not ids:
+                del bucket[key]
+
+
+# 全局保存的搜索索引实例
+saved_search_index = SavedSearchIndex()
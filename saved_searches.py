@@ -0,0 +1,132 @@
+from flask import Blueprint, request, current_app
+from models import SavedSearch, ItemCategory, Message, db
+from utils import success_response, error_response, validate_required_fields, get_current_user
+from search_index import tokenize_query
+from saved_search_index import saved_search_index
+
+saved_searches_bp = Blueprint('saved_searches', __name__, url_prefix='/api/v1/saved-searches')
+
+def notify_saved_searches(items):
+    """新物品提交后，给保存了匹配搜索的用户发送站内消息
+
+    每个用户对每个物品只收到一条消息。通知失败不影响物品发布，只记录日志。
+    """
+    try:
+        notified = set()
+        for item in items:
+            for _, user_id, name in saved_search_index.match(item):
+                if (user_id, item.item_id) in notified:
+                    continue
+                notified.add((user_id, item.item_id))
+                db.session.add(Message(
+                    recipient_id=user_id,
+                    type='system_announcement',
+                    related_id=item.item_id,
+                    content=f'您保存的搜索「{name}」有新物品：{item.title}'
+                ))
+        if notified:
+            db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        current_app.logger.warning('发送保存的搜索通知失败: %s', e)
+
+@saved_searches_bp.route('', methods=['GET'])
+def get_saved_searches():
+    """获取当前用户保存的搜索"""
+    try:
+        current_user_id = get_current_user().user_id
+        saved_searches = SavedSearch.query.filter_by(user_id=current_user_id)\
+            .order_by(SavedSearch.created_at.desc()).all()
+        
+        return success_response(
+            data=[saved_search.to_dict() for saved_search in saved_searches],
+            message="获取保存的搜索成功"
+        )
+        
+    except Exception as e:
+        return error_response(f"获取保存的搜索失败: {str(e)}", 500)
+
+@saved_searches_bp.route('', methods=['POST'])
+def create_saved_search():
+    """保存搜索条件，有匹配的新物品发布时通过站内消息提醒"""
+    try:
+        current_user_id = get_current_user().user_id
+        data = request.get_json()
+        
+        if not data:
+            return error_response("请求数据不能为空")
+        
+        validation_error = validate_required_fields(data, ['name'])
+        if validation_error:
+            return error_response(validation_error)
+        
+        name = data['name'].strip()
+        keyword = (data.get('keyword') or '').strip() or None
+        category_id = data.get('category_id')
+        condition = data.get('condition')
+        
+        if len(name) < 1 or len(name) > 50:
+            return error_response("搜索名称长度必须在1-50个字符之间")
+        
+        if keyword is None and category_id is None:
+            return error_response("关键词和分类至少需要填写一项")
+        
+        if keyword is not None:
+            if len(keyword) > 100:
+                return error_response("关键词不能超过100个字符")
+            if not tokenize_query(keyword):
+                return error_response("关键词中没有可搜索的内容")
+        
+        if category_id is not None and not ItemCategory.query.get(category_id):
+            return error_response("分类不存在")
+        
+        if condition is not None and condition not in ['new', 'like_new', 'used', 'worn']:
+            return error_response("物品状态必须是: new, like_new, used, worn 之一")
+        
+        max_count = current_app.config.get('SAVED_SEARCHES_MAX', 20)
+        if SavedSearch.query.filter_by(user_id=current_user_id).count() >= max_count:
+            return error_response(f"最多只能保存{max_count}个搜索")
+        
+        saved_search = SavedSearch(
+            user_id=current_user_id,
+            name=name,
+            keyword=keyword,
+            category_id=category_id,
+            condition=condition
+        )
+        db.session.add(saved_search)
+        db.session.commit()
+        saved_search_index.upsert(saved_search)
+        
+        return success_response(
+            data=saved_search.to_dict(),
+            message="保存搜索成功",
+            code=201
+        )
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"保存搜索失败: {str(e)}", 500)
+
+@saved_searches_bp.route('/<int:saved_search_id>', methods=['DELETE'])
+def delete_saved_search(saved_search_id):
+    """删除保存的搜索"""
+    try:
+        current_user_id = get_current_user().user_id
+        saved_search = SavedSearch.query.get(saved_search_id)
+        
+        if not saved_search or saved_search.user_id != current_user_id:
+            return error_response("保存的搜索不存在", 404)
+        
+        db.session.delete(saved_search)
+        db.session.commit()
+        saved_search_index.remove(saved_search_id)
+        
+        return success_response(
+            message="删除保存的搜索成功",
+            code=204
+        )
+        
+    except Exception as e:
+        db.session.rollback()
+        return error_response(f"删除保存的搜索失败: {str(e)}", 500)
@@ -0,0 +1,202 @@
+import bisect
+import math
+import re
+import threading
+import unicodedata
+from sqlalchemy import select
+from versions import VersionTracker
+
+# 标题中出现的词元权重高于描述
+TITLE_WEIGHT = 3
+DESCRIPTION_WEIGHT = 1
+
+# 中日韩统一表意文字（含扩展A区和兼容区）
+_CJK_PATTERN = r'\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff'
+# 英文和数字在字母与数字的交界处切开，型号 iphone13 切为 iphone 和 13
+_TOKEN_RE = re.compile(r'([' + _CJK_PATTERN + r']+)|([a-z]+|[0-9]+)')
+
+
+def _normalize(text):
+    """全角转半角并统一小写"""
+    return unicodedata.normalize('NFKC', text or '').lower()
+
+
+def tokenize(text):
+    """文档分词：中文连续片段切为单字和相邻二元组，英文单词和数字分别切分"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(_normalize(text)):
+        if cjk:
+            tokens.extend(cjk)
+            tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    return tokens
+
+
+def tokenize_query(text):
+    """查询分词：中文片段只取二元组（单字片段取单字），保证各词元同时命中才算匹配"""
+    tokens = []
+    for cjk, word in _TOKEN_RE.findall(_normalize(text)):
+        if cjk:
+            if len(cjk) == 1:
+                tokens.append(cjk)
+            else:
+                tokens.extend(cjk[i:i + 2] for i in range(len(cjk) - 1))
+        else:
+            tokens.append(word)
+    # 去重并保持顺序
+    return list(dict.fromkeys(tokens))
+
+
+def is_prefix_token(token):
+    """查询中的英文单词按前缀匹配（mac 能匹配 macbook），中文和数字按整个词元匹配"""
+    return token.isascii() and token.isalpha()
+
+
+class SearchIndex:
+    """物品标题和描述的进程内倒排索引
+
+    每个词元对应一个 {item_id: 权重} 的倒排表，查询时从最短的倒排表开始求交集，
+    再按 词频权重 × IDF 打分排序。英文查询词在有序的单词表中二分查找，
+    以它为前缀的所有单词的倒排表合并后参与求交集。
+    索引在首次查询时从数据库加载，之后由物品的增删改接口增量维护；
+    物品表的版本号变化（其他进程提交了物品的写入）时重新加载。
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._tracker = VersionTracker('item')
+        self._postings = {}  # token -> {item_id: weight}
+        self._doc_tokens = {}  # item_id -> tuple(token)
+        self._words = []  # 有序的英文单词表，用于前缀查找
+
+    def ensure_loaded(self):
+        """首次使用或物品表的版本号变化时，从数据库加载所有物品的标题和描述"""
+        if self._loaded and self._tracker.is_current():
+            return
+        with self._lock:
+            # 先读版本号再加载数据：加载期间有新的提交时，记下的是旧版本号，下次使用时会再次加载。
+            # 数据在新的连接上读取：请求的会话可能早已开启事务，MySQL 可重复读隔离级别下
+            # 读到的是版本号之前的快照，记下新版本号后索引会一直停留在旧数据上
+            version = self._tracker.current()
+            if self._loaded and self._tracker.seen == version:
+                return
+            self._clear()
+            from models import Item, db
+            with db.engine.connect() as connection:
+                rows = connection.execution_options(yield_per=1000).execute(
+                    select(Item.item_id, Item.title, Item.description)
+                )
+                for item_id, title, description in rows:
+                    self._add(item_id, title, description)
+            self._tracker.mark(version)
+            self._loaded = True
+
+    def reset(self):
+        """清空索引，下次查询时重新加载"""
+        with self._lock:
+            self._clear()
+            self._tracker.reset()
+            self._loaded = False
+
+    def _clear(self):
+        self._postings.clear()
+        self._doc_tokens.clear()
+        self._words.clear()
+
+    def upsert(self, item_id, title, description):
+        """新增或重建物品的索引"""
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(item_id)
+            self._add(item_id, title, description)
+            self._tracker.advance()
+
+    def remove(self, item_id):
+        """从索引中移除物品"""
+        with self._lock:
+            if self._loaded:
+                self._remove(item_id)
+                self._tracker.advance()
+
+    def advance(self):
+        """本进程提交的物品写入没有改动标题和描述（如只修改了状态）时调用，把索引记为最新，不必重新加载"""
+        with self._lock:
+            if self._loaded:
+                self._tracker.advance()
+
+    def search(self, text):
+        """返回同时包含所有查询词元的物品ID，按相关度降序排列
+
+        查询中没有可索引的词元时返回 None，由调用方退化为普通的子串匹配。
+        """
+        tokens = tokenize_query(text)
+        if not tokens:
+            return None
+        self.ensure_loaded()
+
+        with self._lock:
+            postings = [self._posting(token) for token in tokens]
+            if not all(postings):
+                return []
+
+            doc_count = len(self._doc_tokens)
+            postings.sort(key=len)
+            candidates = set(postings[0])
+            for posting in postings[1:]:
+                candidates.intersection_update(posting)
+                if not candidates:
+                    return []
+
+            scores = dict.fromkeys(candidates, 0.0)
+            for posting in postings:
+                idf = math.log(1 + doc_count / len(posting))
+                for item_id in candidates:
+                    scores[item_id] += posting[item_id] * idf
+
+        return sorted(scores, key=lambda item_id: (-scores[item_id], -item_id))
+
+    def _posting(self, token):
+        """查询词元的倒排表；英文单词合并所有以它为前缀的单词，同一物品取最高的权重"""
+        if not is_prefix_token(token):
+            return self._postings.get(token)
+        merged = {}
+        index = bisect.bisect_left(self._words, token)
+        while index < len(self._words) and self._words[index].startswith(token):
+            for item_id, weight in self._postings[self._words[index]].items():
+                if weight > merged.get(item_id, 0):
+                    merged[item_id] = weight
+            index += 1
+        return merged
+
+    def _add(self, item_id, title, description):
+        weights = {}
+        for token in tokenize(title):
+            weights[token] = weights.get(token, 0) + TITLE_WEIGHT
+        for token in tokenize(description):
+            weights[token] = weights.get(token, 0) + DESCRIPTION_WEIGHT
+
+        for token, weight in weights.items():
+            posting = self._postings.get(token)
+            if posting is None:
+                posting = self._postings[token] = {}
+                if is_prefix_token(token):
+                    bisect.insort(self._words, token)
+            posting[item_id] = weight
+        self._doc_tokens[item_id] = tuple(weights)
+
+    def _remove(self, item_id):
+        for token in self._doc_tokens.pop(item_id, ()):
+            posting = self._postings.get(token)
+            if posting is not None:
+                posting.pop(item_id, None)
+                if not posting:
+                    del self._postings[token]
+                    if is_prefix_token(token):
+                        del self._words[bisect.bisect_left(self._words, token)]
+
+
+# 全局全文索引实例
+search_index = SearchIndex()
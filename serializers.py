@@ -0,0 +1,251 @@
+from collections import defaultdict
+from sqlalchemy.orm import load_only
+from sqlalchemy.orm.attributes import set_committed_value
+from models import User, Item, ItemImage, ItemCategory, Request, Review, Message
+
+# 批量序列化：先用固定数量的 IN 查询把一页数据关联的行全部取出，
+# 再直接写入各对象的关系属性，to_dict 访问关系时不会再触发懒加载。
+# 每页的查询次数与页大小无关：
+#   物品   分类 + 用户 + 图片         = 3 次
+#   请求   物品 + 用户（请求者/物主） = 2 次
+#   评价   用户（评价人/被评价人）    = 1 次
+#   消息   用户（发送者/接收者）      = 1 次
+#
+# 列表接口可以通过 fields= 只返回部分字段（稀疏字段集），
+# 这时只加载这些字段依赖的列，也不会预加载没有用到的关联数据。
+
+# 各输出字段依赖的数据库列（主键和 created_at 总会加载）
+ITEM_FIELDS = {
+    'item_id': [],
+    'user_id': ['user_id'],
+    'title': ['title'],
+    'description': ['description'],
+    'category_id': ['category_id'],
+    'category_name': ['category_id'],
+    'status': ['status'],
+    'condition': ['condition'],
+    'latitude': ['latitude'],
+    'longitude': ['longitude'],
+    'created_at': [],
+    'updated_at': ['updated_at'],
+    'owner_username': ['user_id'],
+    'primary_image_url': ['primary_image_url'],
+    'primary_thumbnail_url': ['primary_image_url'],
+    'images': [],
+}
+
+REQUEST_FIELDS = {
+    'id': [],
+    'request_id': [],
+    'item_id': ['item_id'],
+    'item_title': ['item_id'],
+    'requester_id': ['requester_id'],
+    'requester_username': ['requester_id'],
+    'owner_username': ['item_id'],
+    'message': ['message'],
+    'status': ['status'],
+    'created_at': [],
+    'updated_at': ['updated_at'],
+}
+
+USER_FIELDS = {
+    'user_id': [],
+    'username': ['username'],
+    'email': ['email'],
+    'phone': ['phone'],
+    'address': ['address'],
+    'latitude': ['latitude'],
+    'longitude': ['longitude'],
+    'reputation_score': ['reputation_score'],
+    'is_admin': ['is_admin'],
+    'created_at': [],
+    'items_count': [],
+    'requests_count': [],
+    'transactions_count': [],
+    'last_login': [],
+}
+
+
+def parse_fields(value, field_columns, id_field):
+    """解析逗号分隔的 fields 参数
+
+    未传或为空时返回 None 表示全部字段；返回的集合总是包含 id_field，
+    包含未知字段时抛出 ValueError。
+    """
+    if not value:
+        return None
+    fields = {name.strip() for name in value.split(',') if name.strip()}
+    unknown = sorted(fields - set(field_columns))
+    if unknown:
+        raise ValueError(f"不支持的字段: {', '.join(unknown)}")
+    fields.add(id_field)
+    return fields
+
+
+def load_fields(query, model, field_columns, fields):
+    """让查询只加载输出字段依赖的列，主键和游标分页用到的 created_at 总会加载"""
+    if fields is None:
+        return query
+    names = {column.key for column in model.__mapper__.primary_key} | {'created_at'}
+    for name in fields:
+        names.update(field_columns[name])
+    return query.options(load_only(*(getattr(model, name) for name in sorted(names))))
+
+
+def _wants(fields, *names):
+    return fields is None or any(name in fields for name in names)
+
+
+def _load_by_ids(model, pk_column, ids):
+    """按主键批量加载，返回 {主键: 对象}"""
+    ids = {i for i in ids if i is not None}
+    if not ids:
+        return {}
+    return {getattr(obj, pk_column.key): obj for obj in model.query.filter(pk_column.in_(ids)).all()}
+
+
+def _attach(objects, fk_attr, relation, related_by_id):
+    """把预加载的对象写入多对一关系属性"""
+    for obj in objects:
+        set_committed_value(obj, relation, related_by_id.get(getattr(obj, fk_attr)))
+
+
+def preload_items(items, include_images=True, fields=None):
+    """批量预加载物品的分类、发布者和图片，返回 {item_id: [ItemImage]}
+
+    fields 不为 None 时只预加载这些字段用到的关联数据。
+    """
+    images_by_item = defaultdict(list)
+    if not items:
+        return images_by_item
+
+    if _wants(fields, 'category_name'):
+        categories = _load_by_ids(ItemCategory, ItemCategory.category_id, (item.category_id for item in items))
+        _attach(items, 'category_id', 'category', categories)
+
+    if _wants(fields, 'owner_username'):
+        owners = _load_by_ids(User, User.user_id, (item.user_id for item in items))
+        _attach(items, 'user_id', 'owner', owners)
+
+    if include_images and _wants(fields, 'images'):
+        item_ids = [item.item_id for item in items]
+        images = ItemImage.query.filter(ItemImage.item_id.in_(item_ids))\
+            .order_by(ItemImage.item_id, ItemImage.image_id).all()
+        for image in images:
+            images_by_item[image.item_id].append(image)
+
+    if _wants(fields, 'primary_image_url', 'primary_thumbnail_url'):
+        _fill_primary_images(items, images_by_item if include_images and _wants(fields, 'images') else None)
+
+    return images_by_item
+
+
+def _fill_primary_images(items, images_by_item=None):
+    """为还没有冗余主图的旧数据补上 primary_image_url（只写入对象，不落库）
+
+    图片已经预加载时直接从中选取，否则一次查询取出这些物品的图片。
+    """
+    missing = [item for item in items if item.primary_image_url is None]
+    if not missing:
+        return
+    if images_by_item is None:
+        images_by_item = defaultdict(list)
+        images = ItemImage.query.filter(ItemImage.item_id.in_([item.item_id for item in missing]))\
+            .order_by(ItemImage.item_id, ItemImage.image_id).all()
+        for image in images:
+            images_by_item[image.item_id].append(image)
+    for item in missing:
+        images = images_by_item.get(item.item_id)
+        if images:
+            primary = next((image for image in images if image.is_primary), images[0])
+            set_committed_value(item, 'primary_image_url', primary.image_url)
+
+
+def serialize_items(items, include_images=True, fields=None):
+    """批量序列化物品"""
+    images_by_item = preload_items(items, include_images, fields)
+    return [
+        item.to_dict(include_images=include_images, images=images_by_item[item.item_id], fields=fields)
+        for item in items
+    ]
+
+
+def preload_requests(requests, include_owner=False, fields=None):
+    """批量预加载请求关联的物品和用户，include_owner 时同时加载物品所有者
+
+    fields 不为 None 时只预加载这些字段用到的关联数据。
+    """
+    if not requests:
+        return
+
+    include_owner = include_owner and _wants(fields, 'owner_username')
+    items = {}
+    if include_owner or _wants(fields, 'item_title'):
+        items = _load_by_ids(Item, Item.item_id, (req.item_id for req in requests))
+        _attach(requests, 'item_id', 'item', items)
+
+    include_requester = _wants(fields, 'requester_username')
+    user_ids = {req.requester_id for req in requests} if include_requester else set()
+    if include_owner:
+        user_ids.update(item.user_id for item in items.values())
+    users = _load_by_ids(User, User.user_id, user_ids)
+    if include_requester:
+        _attach(requests, 'requester_id', 'requester', users)
+    if include_owner:
+        _attach(items.values(), 'user_id', 'owner', users)
+
+
+def serialize_requests(requests):
+    """批量序列化交易请求"""
+    preload_requests(requests)
+    return [req.to_dict() for req in requests]
+
+
+def preload_reviews(reviews):
+    """批量预加载评价的评价人和被评价人"""
+    if not reviews:
+        return
+    user_ids = {review.reviewer_id for review in reviews} | {review.reviewee_id for review in reviews}
+    users = _load_by_ids(User, User.user_id, user_ids)
+    _attach(reviews, 'reviewer_id', 'reviewer', users)
+    _attach(reviews, 'reviewee_id', 'reviewee', users)
+
+
+def serialize_reviews(reviews):
+    """批量序列化评价"""
+    preload_reviews(reviews)
+    return [review.to_dict() for review in reviews]
+
+
+def preload_messages(messages):
+    """批量预加载消息的发送者和接收者"""
+    if not messages:
+        return
+    user_ids = {message.sender_id for message in messages} | {message.recipient_id for message in messages}
+    users = _load_by_ids(User, User.user_id, user_ids)
+    _attach(messages, 'sender_id', 'sender', users)
+    _attach(messages, 'recipient_id', 'recipient', users)
+
+
+def serialize_messages(messages):
+    """批量序列化消息"""
+    preload_messages(messages)
+    return [message.to_dict() for message in messages]
+
+
+_SERIALIZERS = {
+    Item: serialize_items,
+    Request: serialize_requests,
+    Review: serialize_reviews,
+    Message: serialize_messages,
+}
+
+
+def serialize_models(rows):
+    """按模型类型选择批量序列化函数，没有关联数据的模型直接调用 to_dict"""
+    if not rows:
+        return []
+    serializer = _SERIALIZERS.get(type(rows[0]))
+    if serializer:
+        return serializer(rows)
+    return [row.to_dict() for row in rows]
@@ -1,12 +1,17 @@
 from flask import Blueprint, request, jsonify
 from models import User, Item, Request, Review, Message, ItemCategory, db
-from utils import success_response, error_response, get_current_user
+from utils import success_response, error_response, get_current_user, versioned
 from sqlalchemy import func, and_
 from datetime import datetime, timedelta
 
 statistics_bp = Blueprint('statistics', __name__, url_prefix='/api/v1')
 
+def today_key():
+    """按日期统计的接口每天的结果不同，当天日期参与 ETag 计算"""
+    return datetime.now().date().isoformat()
+
 @statistics_bp.route('/users/count', methods=['GET'])
+@versioned('user')
 def get_users_count():
     """获取用户总数"""
     try:
@@ -19,6 +24,7 @@ def get_users_count():
         return error_response(f"获取用户总数失败: {str(e)}", 500)
 
 @statistics_bp.route('/items/count', methods=['GET'])
+@versioned('item')
 def get_items_count():
     """获取物品总数"""
     try:
@@ -31,6 +37,7 @@ def get_items_count():
         return error_response(f"获取物品总数失败: {str(e)}", 500)
 
 @statistics_bp.route('/requests/count', methods=['GET'])
+@versioned('request')
 def get_requests_count():
     """获取交易请求数量"""
     try:
@@ -49,6 +56,7 @@ def get_requests_count():
         return error_response(f"获取交易请求数量失败: {str(e)}", 500)
 
 @statistics_bp.route('/reviews/count', methods=['GET'])
+@versioned('review')
 def get_reviews_count():
     """获取评价总数"""
     try:
@@ -61,6 +69,7 @@ def get_reviews_count():
         return error_response(f"获取评价总数失败: {str(e)}", 500)
 
 @statistics_bp.route('/messages/count', methods=['GET'])
+@versioned('message')
 def get_messages_count():
     """获取消息总数"""
     try:
@@ -73,6 +82,7 @@ def get_messages_count():
         return error_response(f"获取消息总数失败: {str(e)}", 500)
 
 @statistics_bp.route('/today', methods=['GET'])
+@versioned('user', 'item', 'request', 'review', vary=today_key)
 def get_today_statistics():
     """获取今日统计数据"""
     try:
@@ -113,6 +123,7 @@ def get_today_statistics():
         return error_response(f"获取今日统计数据失败: {str(e)}", 500)
 
 @statistics_bp.route('/user-registration-trend', methods=['GET'])
+@versioned('user', vary=today_key)
 def get_user_registration_trend():
     """获取用户注册趋势"""
     try:
@@ -144,6 +155,7 @@ def get_user_registration_trend():
         return error_response(f"获取用户注册趋势失败: {str(e)}", 500)
 
 @statistics_bp.route('/item-category-distribution', methods=['GET'])
+@versioned('item', 'item_category')
 def get_item_category_distribution():
     """获取物品分类分布"""
     try:
@@ -172,6 +184,7 @@ def get_item_category_distribution():
         return error_response(f"获取物品分类分布失败: {str(e)}", 500)
 
 @statistics_bp.route('/request-status-distribution', methods=['GET'])
+@versioned('request')
 def get_request_status_distribution():
     """获取交易请求状态分布"""
     try:
@@ -206,6 +219,7 @@ def get_request_status_distribution():
         return error_response(f"获取交易请求状态分布失败: {str(e)}", 500)
 
 @statistics_bp.route('/user-reputation-distribution', methods=['GET'])
+@versioned('user')
 def get_user_reputation_distribution():
     """获取用户信誉分布"""
     try:
@@ -242,6 +256,7 @@ def get_user_reputation_distribution():
         return error_response(f"获取用户信誉分布失败: {str(e)}", 500)
 
 @statistics_bp.route('/monthly-transaction-trend', methods=['GET'])
+@versioned('request', vary=today_key)
 def get_monthly_transaction_trend():
     """获取月度交易趋势"""
     try:
@@ -316,6 +331,7 @@ def get_monthly_transaction_trend():
         return error_response(f"获取月度交易趋势失败: {str(e)}", 500)
 
 @statistics_bp.route('/item-condition-distribution', methods=['GET'])
+@versioned('item')
 def get_item_condition_distribution():
     """获取物品新旧程度分布"""
     try:
@@ -348,6 +364,7 @@ def get_item_condition_distribution():
         return error_response(f"获取物品新旧程度分布失败: {str(e)}", 500)
 
 @statistics_bp.route('/daily-activity', methods=['GET'])
+@versioned('user', 'item', 'request', vary=today_key)
 def get_daily_activity():
     """获取最近7天的活跃度统计"""
     try:
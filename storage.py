@@ -0,0 +1,133 @@
+import hashlib
+import os
+import shutil
+import uuid
+from flask import current_app
+
+# 上传文件按内容寻址保存：文件名是内容的 SHA-256 摘要，按摘要前两位分目录，
+# 相同内容无论上传多少次都只保存一份。文件被多少张物品图片引用由 ItemImage.image_url 统计。
+CHUNK_SIZE = 64 * 1024
+
+# 同一种格式的不同扩展名统一成一个，避免相同内容因扩展名不同保存两份
+_EXTENSION_ALIASES = {'.jpeg': '.jpg'}
+
+
+def normalize_extension(filename):
+    """从原始文件名取出小写的扩展名（带点），没有扩展名时返回空字符串"""
+    if '.' not in filename:
+        return ''
+    ext = '.' + filename.rsplit('.', 1)[1].lower()
+    return _EXTENSION_ALIASES.get(ext, ext)
+
+
+def hash_stream(stream):
+    """分块计算文件流的 SHA-256 摘要"""
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def content_location(digest, ext, folder):
+    """返回摘要对应的 (URL, 文件路径)"""
+    relative = f'{folder}/{digest[:2]}/{digest}{ext}'
+    path = os.path.join(current_app.config['UPLOAD_FOLDER'], *relative.split('/'))
+    return f'/static/uploads/{relative}', path
+
+
+def _rewind(stream):
+    """尝试把流回到开头，不支持回退时返回 False"""
+    try:
+        stream.seek(0)
+        return True
+    except (AttributeError, OSError, ValueError):
+        return False
+
+
+def store_stream(stream, ext, folder='items'):
+    """按内容摘要保存文件流，返回 (URL, 文件路径, 是否新写入)
+
+    可以回退的流先完整计算一遍摘要，文件已存在时直接返回，不写磁盘；
+    不可回退的流边写临时文件边计算摘要，内容重复时删除临时文件。
+    """
+    if _rewind(stream):
+        digest = hash_stream(stream)
+        url, path = content_location(digest, ext, folder)
+        if os.path.exists(path):
+            _touch(path)
+            return url, path, False
+        stream.seek(0)
+        temp_path = _temp_path()
+        with open(temp_path, 'wb') as f:
+            shutil.copyfileobj(stream, f, CHUNK_SIZE)
+        return url, path, _place(temp_path, path)
+
+    temp_path = _temp_path()
+    hasher = hashlib.sha256()
+    with open(temp_path, 'wb') as f:
+        for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+            hasher.update(chunk)
+            f.write(chunk)
+    return store_file(temp_path, ext, folder, hasher.hexdigest())
+
+
+def store_file(temp_path, ext, folder='items', digest=None):
+    """把已写好的临时文件按内容摘要归档，返回 (URL, 文件路径, 是否新写入)
+
+    内容已存在时删除临时文件；digest 为 None 时先计算摘要。
+    """
+    if digest is None:
+        with open(temp_path, 'rb') as f:
+            digest = hash_stream(f)
+    url, path = content_location(digest, ext, folder)
+    if os.path.exists(path):
+        os.remove(temp_path)
+        _touch(path)
+        return url, path, False
+    return url, path, _place(temp_path, path)
+
+
+def _temp_path():
+    """上传根目录下的临时文件路径；临时文件不放在分片目录中，清理任务删除空目录时不会影响正在写入的文件"""
+    upload_root = current_app.config['UPLOAD_FOLDER']
+    os.makedirs(upload_root, exist_ok=True)
+    return os.path.join(upload_root, f'.{uuid.uuid4().hex}.partial')
+
+
+def _place(temp_path, path):
+    """把临时文件改名到最终位置；并发上传同一内容时后到的一方丢弃自己的副本"""
+    if os.path.exists(path):
+        os.remove(temp_path)
+        _touch(path)
+        return False
+    # 清理任务可能恰好删除了变空的分片目录，改名失败时重建目录再试一次
+    for attempt in range(2):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        try:
+            os.replace(temp_path, path)
+            return True
+        except FileNotFoundError:
+            if attempt or not os.path.exists(temp_path):
+                raise
+
+
+def _touch(path):
+    """重复上传时刷新已有文件的修改时间，孤立文件清理的宽限期从最近一次上传算起"""
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+
+
+def reference_counts(image_urls):
+    """批量统计图片URL被多少条 ItemImage 引用，返回 {URL: 次数}，未被引用的URL不出现在结果中"""
+    from models import ItemImage, db
+    from sqlalchemy import func
+    image_urls = list(set(image_urls))
+    if not image_urls:
+        return {}
+    return dict(
+        db.session.query(ItemImage.image_url, func.count(ItemImage.image_id))
+        .filter(ItemImage.image_url.in_(image_urls))
+        .group_by(ItemImage.image_url).all()
+    )
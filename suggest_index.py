@@ -0,0 +1,164 @@
+import re
+import threading
+from bisect import bisect_left, insort
+from sqlalchemy import select
+from search_index import _normalize
+from versions import VersionTracker
+
+# 词的起始位置：空白或标点之后的第一个文字
+_WORD_START_RE = re.compile(r'(?<=[\W_])[^\W_]')
+
+
+def prefix_keys(text):
+    """返回文本中可作为前缀匹配起点的所有后缀
+
+    整个标题从头匹配，另外每个空白或标点之后的词也可以单独匹配，
+    例如 "二手 MacBook Pro" 可以由 "二手"、"mac"、"pro" 匹配到。
+    """
+    normalized = _normalize(text).strip()
+    if not normalized:
+        return []
+    keys = [normalized]
+    keys.extend(normalized[m.start():] for m in _WORD_START_RE.finditer(normalized))
+    return list(dict.fromkeys(keys))
+
+
+class SuggestIndex:
+    """物品标题和分类名称的前缀索引，用于搜索框的输入联想
+
+    每个可匹配的后缀按字典序保存在有序数组中，查询时二分查找到第一个不小于前缀的位置，
+    向后顺序扫描到不再以前缀开头为止，不访问数据库。
+    索引在首次查询时从数据库加载，之后由物品和分类的增删改接口增量维护；
+    物品表或分类表的版本号变化（其他进程提交了写入）时重新加载。
+    """
+
+    KINDS = ('category', 'item')
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._loaded = False
+        self._tracker = VersionTracker('item', 'item_category')
+        self._entries = {kind: [] for kind in self.KINDS}  # kind -> 有序的 [(后缀, ID)]
+        self._texts = {kind: {} for kind in self.KINDS}  # kind -> {ID: 原文}
+
+    def ensure_loaded(self):
+        """首次使用或物品表、分类表的版本号变化时，从数据库加载所有物品标题和分类名称"""
+        if self._loaded and self._tracker.is_current():
+            return
+        with self._lock:
+            # 先读版本号再加载数据：加载期间有新的提交时，记下的是旧版本号，下次使用时会再次加载。
+            # 数据在新的连接上读取：请求的会话可能早已开启事务，MySQL 可重复读隔离级别下
+            # 读到的是版本号之前的快照，记下新版本号后索引会一直停留在旧数据上
+            version = self._tracker.current()
+            if self._loaded and self._tracker.seen == version:
+                return
+            self._clear()
+            from models import Item, ItemCategory, db
+            with db.engine.connect() as connection:
+                for category_id, name in connection.execute(select(ItemCategory.category_id, ItemCategory.name)):
+                    self._add('category', category_id, name, sort=False)
+                rows = connection.execution_options(yield_per=1000).execute(select(Item.item_id, Item.title))
+                for item_id, title in rows:
+                    self._add('item', item_id, title, sort=False)
+            for entries in self._entries.values():
+                entries.sort()
+            self._tracker.mark(version)
+            self._loaded = True
+
+    def reset(self):
+        """清空索引，下次查询时重新加载"""
+        with self._lock:
+            self._clear()
+            self._tracker.reset()
+            self._loaded = False
+
+    def _clear(self):
+        for kind in self.KINDS:
+            self._entries[kind].clear()
+            self._texts[kind].clear()
+
+    def advance(self):
+        """本进程提交的物品写入没有改动标题（如只修改了状态）时调用，把索引记为最新，不必重新加载"""
+        with self._lock:
+            if self._loaded:
+                self._tracker.advance()
+
+    def upsert_item(self, item_id, title):
+        """新增或更新物品标题"""
+        self._upsert('item', item_id, title)
+
+    def remove_item(self, item_id):
+        """从索引中移除物品"""
+        self._remove_locked('item', item_id)
+
+    def upsert_category(self, category_id, name):
+        """新增或更新分类名称"""
+        self._upsert('category', category_id, name)
+
+    def remove_category(self, category_id):
+        """从索引中移除分类"""
+        self._remove_locked('category', category_id)
+
+    def suggest(self, prefix, limit=10):
+        """返回以 prefix 开头的联想词 [{'type', 'id', 'text'}]，分类在前，相同文本只返回一次"""
+        prefix = _normalize(prefix).strip()
+        if not prefix or limit <= 0:
+            return []
+        self.ensure_loaded()
+
+        results = []
+        seen = set()
+        with self._lock:
+            for kind in self.KINDS:
+                entries = self._entries[kind]
+                texts = self._texts[kind]
+                index = bisect_left(entries, (prefix,))
+                while index < len(entries) and len(results) < limit:
+                    key, ref_id = entries[index]
+                    if not key.startswith(prefix):
+                        break
+                    text = texts[ref_id]
+                    if text not in seen:
+                        seen.add(text)
+                        results.append({'type': kind, 'id': ref_id, 'text': text})
+                    index += 1
+        return results
+
+    def _upsert(self, kind, ref_id, text):
+        with self._lock:
+            if not self._loaded:
+                return
+            self._remove(kind, ref_id)
+            self._add(kind, ref_id, text)
+            self._tracker.advance()
+
+    def _remove_locked(self, kind, ref_id):
+        with self._lock:
+            if self._loaded:
+                self._remove(kind, ref_id)
+                self._tracker.advance()
+
+    def _add(self, kind, ref_id, text, sort=True):
+        if not text:
+            return
+        self._texts[kind][ref_id] = text
+        entries = self._entries[kind]
+        for key in prefix_keys(text):
+            if sort:
+                insort(entries, (key, ref_id))
+            else:
+                entries.append((key, ref_id))
+
+    def _remove(self, kind, ref_id):
+        text = self._texts[kind].pop(ref_id, None)
+        if text is None:
+            return
+        entries = self._entries[kind]
+        for key in prefix_keys(text):
+            index = bisect_left(entries, (key, ref_id))
+            if index < len(entries) and entries[index] == (key, ref_id):
+                del entries[index]
+
+
+# 全局输入联想索引实例
+suggest_index = SuggestIndex()
@@ -0,0 +1,208 @@
+import os
+import threading
+import time
+import click
+from flask import current_app
+from image_variants import UPLOAD_URL_PREFIX, variant_paths, variant_sources
+from storage import reference_counts
+from uploads import SESSION_FOLDER
+
+# 孤立上传文件清理：上传后没有发布成功的图片、物品更新时被替换的图片、随物品删除的图片，
+# 文件都还留在 static/uploads 中。清理任务逐个遍历上传目录（不一次性列出全部文件），
+# 每攒够一批就用一条 GROUP BY 查询统计这些URL被多少条 ItemImage 引用，
+# 删除未被引用且超过宽限期的原图及其衍生版本。宽限期保护刚上传、还没来得及发布物品的图片。
+_TEMP_SUFFIXES = ('.partial', '.tmp')
+
+_timer_lock = threading.Lock()
+_timer_started = False
+
+
+def _scan_files(root):
+    """深度优先遍历目录，逐个产出文件的 os.DirEntry"""
+    stack = [root]
+    while stack:
+        try:
+            entries = os.scandir(stack.pop())
+        except FileNotFoundError:
+            continue
+        with entries:
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif entry.is_file(follow_symlinks=False):
+                    yield entry
+
+
+def _mtime(entry):
+    """文件的修改时间，遍历期间文件已被删除时返回 None"""
+    try:
+        return entry.stat().st_mtime
+    except FileNotFoundError:
+        return None
+
+
+class _Sweep:
+    """一次清理的删除操作和统计"""
+
+    def __init__(self, dry_run):
+        self.dry_run = dry_run
+        self.report = {
+            'scanned': 0,
+            'orphans': 0,
+            'files_deleted': 0,
+            'bytes_reclaimed': 0,
+            'sessions_deleted': 0,
+            'dry_run': dry_run
+        }
+
+    def delete(self, path):
+        """删除文件并计入统计；文件已不存在时什么也不做，返回是否删除"""
+        try:
+            size = os.path.getsize(path)
+            if not self.dry_run:
+                os.remove(path)
+        except FileNotFoundError:
+            return False
+        self.report['files_deleted'] += 1
+        self.report['bytes_reclaimed'] += size
+        return True
+
+    def prune(self, directory, root):
+        """目录（按摘要前两位划分的分片目录）已经变空时删除，不删除 root 本身"""
+        if self.dry_run or os.path.normpath(directory) == os.path.normpath(root):
+            return
+        try:
+            os.rmdir(directory)
+        except OSError:
+            pass
+
+    def flush(self, batch, root):
+        """批量检查一批原图的引用，删除孤立的原图和它的衍生版本，目录删空时一并删除"""
+        if not batch:
+            return
+        referenced = reference_counts(batch.keys())
+        for url, path in batch.items():
+            if url in referenced:
+                continue
+            self.report['orphans'] += 1
+            self.delete(path)
+            for variant_path, _, _ in variant_paths(path).values():
+                self.delete(variant_path)
+            self.prune(os.path.dirname(path), root)
+        batch.clear()
+
+
+def sweep_orphan_uploads(folders=('items',), grace_seconds=None, dry_run=False, batch_size=500):
+    """清理没有被任何物品图片引用、且超过宽限期的上传文件，返回清理报告
+
+    同时清理超过 UPLOAD_SESSION_EXPIRE_HOURS 没有更新的分片上传会话。
+    dry_run 为 True 时只统计将要删除的文件和字节数，不删除。
+    """
+    config = current_app.config
+    upload_root = config['UPLOAD_FOLDER']
+    if grace_seconds is None:
+        grace_seconds = config.get('UPLOAD_GC_GRACE_HOURS', 24) * 3600
+    cutoff = time.time() - grace_seconds
+    sweep = _Sweep(dry_run)
+
+    for folder in folders:
+        root = os.path.join(upload_root, folder)
+        batch = {}
+        for entry in _scan_files(root):
+            sweep.report['scanned'] += 1
+            mtime = _mtime(entry)
+            if mtime is None or mtime >= cutoff:
+                continue
+
+            # 写到一半时进程退出留下的临时文件
+            if entry.name.startswith('.') or entry.name.endswith(_TEMP_SUFFIXES):
+                sweep.delete(entry.path)
+                sweep.prune(os.path.dirname(entry.path), root)
+                continue
+
+            # 衍生版本跟随原图删除；原图已经不存在的衍生版本单独删除
+            sources = variant_sources(entry.path)
+            if sources:
+                if not any(os.path.exists(source) for source in sources):
+                    sweep.delete(entry.path)
+                    sweep.prune(os.path.dirname(entry.path), root)
+                continue
+
+            relative = os.path.relpath(entry.path, upload_root).replace(os.sep, '/')
+            batch[f'{UPLOAD_URL_PREFIX}{relative}'] = entry.path
+            if len(batch) >= batch_size:
+                sweep.flush(batch, root)
+        sweep.flush(batch, root)
+
+    # 上传时先写到上传根目录下的临时文件，写到一半时进程退出会留下来
+    with os.scandir(upload_root) as entries:
+        for entry in entries:
+            if entry.is_file(follow_symlinks=False) and entry.name.endswith(_TEMP_SUFFIXES):
+                mtime = _mtime(entry)
+                if mtime is not None and mtime < cutoff:
+                    sweep.delete(entry.path)
+
+    session_cutoff = time.time() - config.get('UPLOAD_SESSION_EXPIRE_HOURS', 24) * 3600
+    _sweep_sessions(os.path.join(upload_root, SESSION_FOLDER), session_cutoff, sweep)
+    return sweep.report
+
+
+def _sweep_sessions(folder, cutoff, sweep):
+    """删除过期的分片上传会话，会话的元数据和临时文件都超过期限才删除"""
+    sessions = {}
+    for entry in _scan_files(folder):
+        mtime = _mtime(entry)
+        if mtime is None:
+            continue
+        upload_id = entry.name.split('.', 1)[0]
+        paths, latest = sessions.get(upload_id, ([], 0))
+        paths.append(entry.path)
+        sessions[upload_id] = (paths, max(latest, mtime))
+
+    for paths, latest in sessions.values():
+        if latest < cutoff:
+            for path in paths:
+                sweep.delete(path)
+            sweep.report['sessions_deleted'] += 1
+
+
+def _run_periodically(app, interval):
+    while True:
+        time.sleep(interval)
+        with app.app_context():
+            try:
+                report = sweep_orphan_uploads()
+                app.logger.info('孤立上传文件清理完成: %s', report)
+            except Exception as e:
+                app.logger.warning('孤立上传文件清理失败: %s', e)
+
+
+def init_upload_gc(app):
+    """注册 flask gc-uploads 命令；配置了 UPLOAD_GC_INTERVAL_HOURS 时在后台线程中定时清理"""
+    global _timer_started
+
+    @app.cli.command('gc-uploads')
+    @click.option('--dry-run', is_flag=True, help='只统计将要删除的文件，不删除')
+    @click.option('--grace-hours', type=float, default=None, help='宽限期（小时），默认使用 UPLOAD_GC_GRACE_HOURS')
+    def gc_uploads_command(dry_run, grace_hours):
+        """清理没有被物品引用的上传文件"""
+        grace_seconds = None if grace_hours is None else grace_hours * 3600
+        report = sweep_orphan_uploads(grace_seconds=grace_seconds, dry_run=dry_run)
+        action = '可以删除' if dry_run else '已删除'
+        click.echo(
+            f"扫描 {report['scanned']} 个文件，孤立原图 {report['orphans']} 个，"
+            f"{action} {report['files_deleted']} 个文件（含过期上传会话 {report['sessions_deleted']} 个），"
+            f"释放 {report['bytes_reclaimed'] / 1024 / 1024:.1f} MB"
+        )
+
+    interval = app.config.get('UPLOAD_GC_INTERVAL_HOURS')
+    if not interval:
+        return
+    with _timer_lock:
+        if _timer_started:
+            return
+        thread = threading.Thread(
+            target=_run_periodically, args=(app, interval * 3600), name='upload-gc', daemon=True
+        )
+        thread.start()
+        _timer_started = True
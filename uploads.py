@@ -0,0 +1,233 @@
+import os
+import re
+import json
+import time
+import uuid
+from flask import Blueprint, request, current_app
+from utils import success_response, error_response, validate_required_fields, get_current_user, allowed_file, save_uploaded_files
+from storage import CHUNK_SIZE, store_file, normalize_extension
+from image_variants import schedule_variants
+
+uploads_bp = Blueprint('uploads', __name__, url_prefix='/api/v1/upload')
+
+# 分片上传：客户端先创建上传会话，再按偏移量依次 PUT 文件内容，最后确认完成。
+# 分片按偏移量直接写入 <UPLOAD_FOLDER>/.sessions/<会话ID>.partial，已写入的字节数就是文件大小，
+# 网络中断后查询会话即可从断点继续。完成时临时文件按内容摘要改名归档，不再复制一遍。
+SESSION_FOLDER = '.sessions'
+_SESSION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+
+def _session_paths(upload_id):
+    folder = os.path.join(current_app.config['UPLOAD_FOLDER'], SESSION_FOLDER)
+    return os.path.join(folder, f'{upload_id}.json'), os.path.join(folder, f'{upload_id}.partial')
+
+def _load_session(upload_id, user_id):
+    """读取上传会话，返回 (会话信息, 元数据路径, 临时文件路径)，不存在或不属于当前用户时会话信息为 None"""
+    if not _SESSION_ID_RE.match(upload_id):
+        return None, None, None
+    meta_path, partial_path = _session_paths(upload_id)
+    try:
+        with open(meta_path, encoding='utf-8') as f:
+            session = json.load(f)
+    except (OSError, ValueError):
+        return None, None, None
+    if session['user_id'] != user_id or not os.path.exists(partial_path):
+        return None, None, None
+    return session, meta_path, partial_path
+
+def _session_dict(upload_id, session, offset):
+    return {
+        'upload_id': upload_id,
+        'filename': session['filename'],
+        'size': session['size'],
+        'offset': offset,
+        'chunk_size': current_app.config.get('UPLOAD_CHUNK_SIZE', 1024 * 1024)
+    }
+
+def _discard(*paths):
+    for path in paths:
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+@uploads_bp.route('/images', methods=['POST'])
+def upload_images():
+    """一次上传多张图片（表单字段 images 可重复），并发保存，按提交顺序返回图片URL"""
+    try:
+        files = request.files.getlist('images')
+        if not files:
+            return error_response("没有选择文件")
+        
+        max_files = current_app.config.get('UPLOAD_BATCH_MAX', 10)
+        if len(files) > max_files:
+            return error_response(f"一次最多上传{max_files}张图片")
+        
+        # 先检查全部文件，有一张不合格就整体拒绝，不留下保存了一半的结果
+        for index, file in enumerate(files):
+            if not file.filename or not allowed_file(file.filename):
+                return error_response(f"第{index + 1}个文件格式不支持")
+        
+        image_urls = save_uploaded_files(files, 'items')
+        
+        return success_response(
+            data={'image_urls': image_urls},
+            message="图片上传成功"
+        )
+        
+    except Exception as e:
+        return error_response(f"上传失败: {str(e)}", 500)
+
+@uploads_bp.route('/sessions', methods=['POST'])
+def create_upload_session():
+    """创建分片上传会话"""
+    try:
+        current_user_id = get_current_user().user_id
+        data = request.get_json()
+        
+        if not data:
+            return error_response("请求数据不能为空")
+        
+        validation_error = validate_required_fields(data, ['filename', 'size'])
+        if validation_error:
+            return error_response(validation_error)
+        
+        filename = data['filename']
+        size = data['size']
+        if not allowed_file(filename):
+            return error_response("文件格式不支持")
+        
+        max_size = current_app.config.get('UPLOAD_MAX_SIZE', 16 * 1024 * 1024)
+        if not isinstance(size, int) or size <= 0:
+            return error_response("文件大小必须是正整数")
+        if size > max_size:
+            return error_response(f"文件不能超过{max_size // (1024 * 1024)}MB")
+        
+        upload_id = uuid.uuid4().hex
+        meta_path, partial_path = _session_paths(upload_id)
+        os.makedirs(os.path.dirname(meta_path), exist_ok=True)
+        session = {
+            'user_id': current_user_id,
+            'filename': filename,
+            'ext': normalize_extension(filename),
+            'size': size,
+            'created_at': time.time()
+        }
+        open(partial_path, 'wb').close()
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(session, f)
+        
+        return success_response(
+            data=_session_dict(upload_id, session, 0),
+            message="创建上传会话成功",
+            code=201
+        )
+        
+    except Exception as e:
+        return error_response(f"创建上传会话失败: {str(e)}", 500)
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['GET'])
+def get_upload_session(upload_id):
+    """查询上传进度，断线重连后从返回的 offset 继续上传"""
+    try:
+        session, _, partial_path = _load_session(upload_id, get_current_user().user_id)
+        if session is None:
+            return error_response("上传会话不存在", 404)
+        
+        return success_response(
+            data=_session_dict(upload_id, session, os.path.getsize(partial_path)),
+            message="获取上传进度成功"
+        )
+        
+    except Exception as e:
+        return error_response(f"获取上传进度失败: {str(e)}", 500)
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['PUT'])
+def upload_chunk(upload_id):
+    """上传一个分片，请求体是原始文件内容，偏移量由 Upload-Offset 请求头或 offset 参数指定"""
+    try:
+        session, _, partial_path = _load_session(upload_id, get_current_user().user_id)
+        if session is None:
+            return error_response("上传会话不存在", 404)
+        
+        offset = request.headers.get('Upload-Offset', request.args.get('offset'))
+        try:
+            offset = int(offset)
+        except (TypeError, ValueError):
+            return error_response("偏移量必须是整数")
+        
+        # 分片必须从已写入的位置开始，客户端重试时重复发送的分片会被拒绝并得到正确的偏移量
+        current_offset = os.path.getsize(partial_path)
+        if offset != current_offset:
+            return error_response("偏移量与已上传的大小不一致", 409, details={'offset': current_offset})
+        
+        length = request.content_length
+        if length is None:
+            return error_response("缺少 Content-Length 请求头", 411)
+        if offset + length > session['size']:
+            return error_response("分片超出了文件大小")
+        
+        # 直接读取请求体流，按块写入，内存占用与分片大小无关。
+        # 写在 offset 指定的位置而不是追加：重试的请求与原请求同时通过上面的检查时，
+        # 两者写的是同一段内容，文件不会超出声明的大小
+        stream = request.stream
+        remaining = length
+        with open(partial_path, 'r+b') as f:
+            f.seek(offset)
+            while remaining > 0:
+                chunk = stream.read(min(CHUNK_SIZE, remaining))
+                if not chunk:
+                    break
+                f.write(chunk)
+                remaining -= len(chunk)
+        
+        offset = os.path.getsize(partial_path)
+        return success_response(
+            data=_session_dict(upload_id, session, offset),
+            message="分片上传成功"
+        )
+        
+    except Exception as e:
+        return error_response(f"分片上传失败: {str(e)}", 500)
+
+@uploads_bp.route('/sessions/<upload_id>/complete', methods=['POST'])
+def complete_upload_session(upload_id):
+    """所有分片上传完后确认完成，返回图片URL"""
+    try:
+        session, meta_path, partial_path = _load_session(upload_id, get_current_user().user_id)
+        if session is None:
+            return error_response("上传会话不存在", 404)
+        
+        offset = os.path.getsize(partial_path)
+        if offset != session['size']:
+            return error_response("文件尚未上传完整", 409, details={'offset': offset})
+        
+        image_url, file_path, created = store_file(partial_path, session['ext'], 'items')
+        _discard(meta_path)
+        if created:
+            schedule_variants(file_path, current_app._get_current_object())
+        
+        return success_response(
+            data={'image_url': image_url},
+            message="图片上传成功"
+        )
+        
+    except Exception as e:
+        return error_response(f"完成上传失败: {str(e)}", 500)
+
+@uploads_bp.route('/sessions/<upload_id>', methods=['DELETE'])
+def cancel_upload_session(upload_id):
+    """取消上传，删除已上传的分片"""
+    try:
+        session, meta_path, partial_path = _load_session(upload_id, get_current_user().user_id)
+        if session is None:
+            return error_response("上传会话不存在", 404)
+        
+        _discard(partial_path, meta_path)
+        
+        return success_response(
+            message="取消上传成功",
+            code=204
+        )
+        
+    except Exception as e:
+        return error_response(f"取消上传失败: {str(e)}", 500)
@@ -1,10 +1,18 @@
-import os
-import uuid
+import json
+import base64
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
 from functools import wraps
-from flask import request, jsonify, current_app
-from werkzeug.utils import secure_filename
+from flask import request, jsonify, current_app, g, has_request_context
+from sqlalchemy import or_, and_, event
 from models import User, db
+from serializers import serialize_models
+from versions import version_stamps
+from image_variants import schedule_variants
+from storage import store_stream, normalize_extension
 import math
+import hashlib
 from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request, jwt_required
 
 def admin_required(f):
@@ -89,25 +97,45 @@ def allowed_file(filename):
            filename.rsplit('.', 1)[1].lower() in current_app.config['ALLOWED_EXTENSIONS']
 
 def save_uploaded_file(file, folder='images'):
-    """保存上传的文件"""
+    """保存上传的文件，按内容摘要命名，相同内容只保存一份"""
     if file and allowed_file(file.filename):
-        # 生成唯一文件名
-        filename = secure_filename(file.filename)
-        name, ext = os.path.splitext(filename)
-        unique_filename = f"{uuid.uuid4().hex}{ext}"
+        # 扩展名直接取自原始文件名，secure_filename 会去掉中文文件名中的字符导致扩展名丢失
+        ext = normalize_extension(file.filename)
+        image_url, file_path, created = store_stream(file.stream, ext, folder)
         
-        # 确保上传目录存在
-        upload_path = os.path.join(current_app.config['UPLOAD_FOLDER'], folder)
-        os.makedirs(upload_path, exist_ok=True)
-        
-        # 保存文件
-        file_path = os.path.join(upload_path, unique_filename)
-        file.save(file_path)
+        # 缩略图和 WebP 版本在后台线程池中生成，不阻塞上传请求；重复上传时已经生成过
+        if created:
+            schedule_variants(file_path, current_app._get_current_object())
         
         # 返回相对路径
-        return f"/static/uploads/{folder}/{unique_filename}"
+        return image_url
     return None
 
+_upload_executor = None
+_upload_executor_lock = threading.Lock()
+
+def _get_upload_executor(max_workers):
+    global _upload_executor
+    if _upload_executor is None:
+        with _upload_executor_lock:
+            if _upload_executor is None:
+                _upload_executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='upload')
+    return _upload_executor
+
+def save_uploaded_files(files, folder='images'):
+    """在线程池中并发保存多个上传文件，返回与 files 顺序一致的URL列表，不支持的格式对应 None"""
+    app = current_app._get_current_object()
+    workers = app.config.get('UPLOAD_WORKERS', 4)
+    if workers <= 1 or len(files) <= 1:
+        return [save_uploaded_file(file, folder) for file in files]
+    
+    def save(file):
+        # 工作线程没有应用上下文，需要手动推入
+        with app.app_context():
+            return save_uploaded_file(file, folder)
+    
+    return list(_get_upload_executor(workers).map(save, files))
+
 def calculate_distance(lat1, lon1, lat2, lon2):
     """计算两点间距离（公里）"""
     if not all([lat1, lon1, lat2, lon2]):
@@ -125,8 +153,8 @@ def calculate_distance(lat1, lon1, lat2, lon2):
     
     return c * r
 
-def paginate_query(query, page=1, per_page=20):
-    """分页查询"""
+def normalize_pagination(page=1, per_page=20):
+    """规范化分页参数"""
     try:
         page = int(page) if page else 1
         per_page = int(per_page) if per_page else 20
@@ -134,6 +162,23 @@ def paginate_query(query, page=1, per_page=20):
     except (ValueError, TypeError):
         page = 1
         per_page = 20
+    return max(1, page), max(1, per_page)
+
+def build_pagination(page, per_page, total):
+    """根据总数构建分页信息"""
+    pages = (total + per_page - 1) // per_page
+    return {
+        'page': page,
+        'per_page': per_page,
+        'total': total,
+        'pages': pages,
+        'has_prev': page > 1,
+        'has_next': page < pages
+    }
+
+def paginate_query(query, page=1, per_page=20, serializer=None):
+    """分页查询，默认使用批量序列化避免逐行懒加载关联数据"""
+    page, per_page = normalize_pagination(page, per_page)
     
     pagination = query.paginate(
         page=page,
@@ -142,7 +187,7 @@ def paginate_query(query, page=1, per_page=20):
     )
     
     return {
-        'items': [item.to_dict() for item in pagination.items],
+        'items': (serializer or serialize_models)(pagination.items),
         'pagination': {
             'page': pagination.page,
             'per_page': pagination.per_page,
@@ -153,6 +198,146 @@ def paginate_query(query, page=1, per_page=20):
         }
     }
 
+def encode_cursor(created_at, record_id):
+    """将 (created_at, id) 编码为不透明的分页游标"""
+    payload = json.dumps([created_at.isoformat() if created_at else None, record_id])
+    return base64.urlsafe_b64encode(payload.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decode_cursor(cursor):
+    """解析分页游标，返回 (created_at, id)，格式错误时抛出 ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, record_id = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')))
+        return datetime.fromisoformat(created_at), int(record_id)
+    except (TypeError, ValueError, UnicodeError):
+        raise ValueError("分页游标无效")
+
+def is_valid_cursor(cursor):
+    """检查分页游标是否有效，空字符串表示从第一页开始"""
+    if not cursor:
+        return True
+    try:
+        decode_cursor(cursor)
+        return True
+    except ValueError:
+        return False
+
+def paginate_keyset(query, created_column, id_column, after=None, per_page=20,
+                    descending=True, with_total=False, serializer=None):
+    """游标分页：按 (created_at, id) 定位下一页，深度翻页不再需要 OFFSET 扫描
+
+    after 为上一页返回的 next_cursor，为空时从第一页开始；
+    with_total 为 False 时不执行 COUNT，只通过多取一行判断是否还有下一页。
+    """
+    _, per_page = normalize_pagination(1, per_page)
+    
+    total = query.order_by(None).count() if with_total else None
+    
+    if after:
+        created_at, record_id = decode_cursor(after)
+        if descending:
+            query = query.filter(or_(
+                created_column < created_at,
+                and_(created_column == created_at, id_column < record_id)
+            ))
+        else:
+            query = query.filter(or_(
+                created_column > created_at,
+                and_(created_column == created_at, id_column > record_id)
+            ))
+    
+    if descending:
+        query = query.order_by(None).order_by(created_column.desc(), id_column.desc())
+    else:
+        query = query.order_by(None).order_by(created_column.asc(), id_column.asc())
+    
+    rows = query.limit(per_page + 1).all()
+    has_next = len(rows) > per_page
+    rows = rows[:per_page]
+    
+    next_cursor = None
+    if has_next:
+        last = rows[-1]
+        next_cursor = encode_cursor(getattr(last, created_column.key), getattr(last, id_column.key))
+    
+    pagination = {
+        'per_page': per_page,
+        'has_next': has_next,
+        'next_cursor': next_cursor
+    }
+    if total is not None:
+        pagination['total'] = total
+    
+    return {
+        'items': (serializer or serialize_models)(rows),
+        'pagination': pagination
+    }
+
+def init_query_budget(app):
+    """统计每个请求执行的SQL次数，超过 QUERY_BUDGET 时记录警告"""
+    budget = app.config.get('QUERY_BUDGET')
+    if not budget:
+        return
+    
+    with app.app_context():
+        engine = db.engine
+    
+    @event.listens_for(engine, 'before_cursor_execute')
+    def count_query(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context():
+            g.query_count = g.get('query_count', 0) + 1
+    
+    @app.after_request
+    def report_query_count(response):
+        query_count = g.get('query_count', 0)
+        response.headers['X-Query-Count'] = str(query_count)
+        if query_count > budget:
+            app.logger.warning(f"{request.method} {request.path} 执行了 {query_count} 次查询，超过预算 {budget}")
+        return response
+
+def make_etag(*parts):
+    """由若干部分拼出 ETag"""
+    return hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+
+def etag_response(etag, build):
+    """条件GET：If-None-Match 命中时直接返回304，不执行 build 构建响应体
+
+    版本计数器只保存在本进程、且配置不允许据此判断时，其他进程的写入不会改变 ETag，
+    这时不返回 ETag，每次都构建完整的响应。
+    """
+    if not version_stamps.shared and not current_app.config.get('ETAG_WITH_LOCAL_VERSIONS', True):
+        result = build()
+        response, code = result if isinstance(result, tuple) else (result, 200)
+        if code == 200:
+            response.headers['Cache-Control'] = 'no-cache'
+        return response, code
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        result = build()
+        response, code = result if isinstance(result, tuple) else (result, 200)
+        if code != 200:
+            return response, code
+    response.set_etag(etag, weak=True)
+    # 允许客户端缓存，但每次使用前都要带着 ETag 回源验证
+    response.headers['Cache-Control'] = 'no-cache'
+    return response
+
+def versioned(*names, vary=None):
+    """按数据版本号生成 ETag 的装饰器，数据未变化时直接返回304，不执行视图函数
+
+    names 为视图依赖的版本计数器，vary 返回其他会影响响应内容的值（如当天日期）。
+    """
+    def decorator(f):
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            parts = [version_stamps.stamp(*names), request.full_path]
+            if vary:
+                parts.append(vary())
+            return etag_response(make_etag(*parts), lambda: f(*args, **kwargs))
+        return decorated_function
+    return decorator
+
 def success_response(data=None, message="操作成功", code=200):
     """成功响应格式"""
     response = {
@@ -0,0 +1,151 @@
+import threading
+import uuid
+from itertools import chain
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from cache import LocalSharedBackend
+
+# 数据版本号：每张表一个计数器，事务提交后对本次改动过的表加一。
+# 物品和图片还会按物品ID维护单独的计数器（item:<id>），
+# 无法确定具体行的批量 UPDATE/DELETE 则对 <表名>:* 计数器加一。
+# 读接口用相关计数器拼出 ETag，计数器没变就说明数据没变，可以不查库直接返回304。
+#
+# 计数器默认保存在进程内，多进程部署时必须配置共享后端（CACHE_SHARED_BACKEND），
+# 否则其他进程的写入不会让本进程的 ETag 失效；没有共享后端时由 ETAG_WITH_LOCAL_VERSIONS 决定是否返回304。
+
+
+class VersionStamps:
+    """按名称维护的数据版本计数器"""
+
+    def __init__(self):
+        self.backend = LocalSharedBackend()
+        self.shared = False  # 是否配置了各进程共用的后端
+        self.epoch = uuid.uuid4().hex
+
+    def configure(self, shared=None):
+        """设置计数器的存储后端
+
+        epoch 用来区分不同的计数器生命周期：本地计数器在进程重启后从0开始，
+        共享后端被清空后也会重新生成 epoch，避免旧的 ETag 被误判为未变化。
+        """
+        self.backend = shared if shared is not None else LocalSharedBackend()
+        self.shared = shared is not None
+        epoch = self.backend.get('version:epoch')
+        if epoch is None:
+            self.backend.set('version:epoch', uuid.uuid4().hex)
+            epoch = self.backend.get('version:epoch')
+        self.epoch = epoch.decode('utf-8') if isinstance(epoch, bytes) else epoch
+
+    def get(self, name):
+        value = self.backend.get(f'version:{name}')
+        return int(value) if value is not None else 0
+
+    def bump(self, name):
+        return self.backend.incr(f'version:{name}')
+
+    def stamp(self, *names):
+        """把多个计数器拼成一个版本戳"""
+        return self.epoch + ':' + '.'.join(str(self.get(name)) for name in names)
+
+
+version_stamps = VersionStamps()
+
+
+class VersionTracker:
+    """进程内索引所依赖的版本计数器
+
+    索引加载前读取一次计数器（current），加载完成后记下（mark），之后每次使用前比较：
+    任何进程提交了相关的写入都会让计数器变化，索引需要重新加载。
+    本进程提交后立即把改动增量应用到索引的，调用 advance 记为最新，避免无谓的重新加载。
+    """
+
+    def __init__(self, *names):
+        self.names = names
+        self.seen = None
+
+    def current(self):
+        return version_stamps.epoch, tuple(version_stamps.get(name) for name in self.names)
+
+    def is_current(self):
+        return self.seen is not None and self.seen == self.current()
+
+    def mark(self, value):
+        self.seen = value
+
+    def advance(self):
+        """增量应用了本进程的一次提交：计数器只比记下的多出这一次时直接记为最新，否则留待重新加载"""
+        if self.seen is None:
+            return
+        current = self.current()
+        if current[0] == self.seen[0] and sum(current[1]) - sum(self.seen[1]) in (0, 1):
+            self.seen = current
+
+    def reset(self):
+        self.seen = None
+
+_listeners_installed = False
+_install_lock = threading.Lock()
+
+
+def _pending(session):
+    return session.info.setdefault('changed_versions', set())
+
+
+def _on_after_flush(session, flush_context):
+    """记录本次 flush 改动过的表和物品"""
+    pending = _pending(session)
+    for obj in chain(session.new, session.dirty, session.deleted):
+        table = getattr(obj, '__tablename__', None)
+        if table is None:
+            continue
+        pending.add(table)
+        if table == 'item' and obj.item_id is not None:
+            pending.add(f'item:{obj.item_id}')
+        elif table == 'item_image' and obj.item_id is not None:
+            pending.add(f'item:{obj.item_id}')
+
+
+def _on_orm_execute(orm_execute_state):
+    """记录批量 INSERT/UPDATE/DELETE 影响的表"""
+    is_insert = orm_execute_state.is_insert
+    if not (is_insert or orm_execute_state.is_update or orm_execute_state.is_delete):
+        return
+    mapper = orm_execute_state.bind_mapper
+    if mapper is None:
+        return
+    table = mapper.local_table.name
+    pending = _pending(orm_execute_state.session)
+    pending.add(table)
+    if not is_insert:
+        # 批量插入的新行之前不存在，不会让已有行的缓存失效
+        pending.add(f'{table}:*')
+
+
+def _on_after_commit(session):
+    """事务提交后递增计数器"""
+    pending = session.info.pop('changed_versions', None)
+    for name in pending or ():
+        version_stamps.bump(name)
+
+
+def _on_after_rollback(session):
+    session.info.pop('changed_versions', None)
+
+
+def init_versions(app, shared=None):
+    """配置计数器后端并注册会话事件"""
+    global _listeners_installed
+    version_stamps.configure(shared)
+    with _install_lock:
+        if _listeners_installed:
+            return
+        event.listen(Session, 'after_flush', _on_after_flush)
+        event.listen(Session, 'do_orm_execute', _on_orm_execute)
+        event.listen(Session, 'after_commit', _on_after_commit)
+        event.listen(Session, 'after_rollback', _on_after_rollback)
+        _listeners_installed = True
+
+
+def item_version_names(item_id):
+    """物品详情载荷依赖的计数器"""
+    return [f'item:{item_id}', 'item:*', 'item_image:*', 'item_category', 'user']